@@ -1,3 +1,5 @@
+from concurrent.futures import ThreadPoolExecutor
+
 from squid_py.agreements.service_agreement import ServiceAgreement
 from squid_py.agreements.service_factory import ServiceTypes
 from squid_py.did import did_to_id_bytes, id_to_did, is_did_valid
@@ -17,25 +19,40 @@ def get_agreement_from_id(ocn, agreement_id):
     return get_agreement_from_did(ocn, did)
 
 
-def list_agreements(did_or_address, ocean=None):
+def get_agreement_ids(did):
+    """
+    Agreement ids of a DID; a failed lookup is logged and yields none, so
+    one bad DID does not end a sweep over many
+    """
+    agreement_store = AgreementStoreManager.get_instance()
     try:
-        assert(is_did_valid(did_or_address), True)
-        agreement_store = AgreementStoreManager.get_instance()
-        agreement_ids = [
+        return [
             Web3Provider.get_web3().toHex(_id)
-            for _id in agreement_store.contract_concise \
-                .getAgreementIdsForDID(did_to_id_bytes(did_or_address))
+            for _id in agreement_store.contract_concise
+            .getAgreementIdsForDID(did_to_id_bytes(did))
         ]
     except Exception as e:
-        if did_or_address == 'me':
-            did_or_address = ocean.account.address
-        agreement_ids = []
-        for did in ocean.assets.list(did_or_address):
-            try:
-                agreement_ids += list_agreements(did, ocean)
-            except ValueError as e:
-                pass
-    return agreement_ids
+        print(f'skip: agreements of {did}: {e}')
+        return []
+
+
+def list_agreements(did_or_address, ocean=None, workers=8):
+    """
+    Yield agreement ids for a DID, or for every asset owned by an address
+
+    DIDs are queried on a bounded thread pool, in asset order, so callers
+    can start processing before the enumeration is finished.
+    """
+    if did_or_address.startswith('did:') and is_did_valid(did_or_address):
+        yield from get_agreement_ids(did_or_address)
+        return
+
+    if did_or_address == 'me':
+        did_or_address = ocean.account.address
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for agreement_ids in executor.map(
+                get_agreement_ids, ocean.assets.list(did_or_address)):
+            yield from agreement_ids
 
 
 def create(ocean, account, did, service_id):
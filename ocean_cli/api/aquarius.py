@@ -0,0 +1,16 @@
+from squid_py.aquarius.aquarius import Aquarius
+
+from ocean_cli.api.http import get_http_client
+
+
+class PooledAquarius(Aquarius):
+    """
+    Aquarius client on the shared HTTP client
+
+    squid builds a new Aquarius, with a new session, for every call; this
+    one reuses the pooled keep-alive connections and records latency.
+    """
+
+    def __init__(self, aquarius_url):
+        super().__init__(aquarius_url)
+        self.requests_session = get_http_client()
@@ -1,6 +1,9 @@
+import hashlib
 import json
 import os
 import time, datetime
+from urllib import parse
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
 from secret_store_client.client import RPCError
@@ -14,6 +17,8 @@ from squid_py.keeper.web3_provider import Web3Provider
 from squid_py.brizo import BrizoProvider
 
 from ocean_cli.api.agreements import create_agreement
+from ocean_cli.api.http import get_http_client
+from ocean_cli.api.index import get_asset_index
 
 
 def make_metadata(name, author, files, price,
@@ -86,7 +91,7 @@ def publish(name,
                   ocean=ocean)
 
 
-def authorize(did, ocean=None, wait=5):
+def authorize(did, ocean=None, timeout=60):
     from ocean_cli.api.conditions import check_permissions
 
     # order
@@ -96,14 +101,36 @@ def authorize(did, ocean=None, wait=5):
         # TODO: get agreement id for did & consumer
         agreement_id = None
 
-    # get credentials
-    for _ in range(wait):
-        service_endpoint, secret = credentials(ocean, did)
-        if isinstance(secret, dict):
-            return agreement_id, service_endpoint, secret
-        print(secret)
-        time.sleep(1)
-    return agreement_id, None, None
+    return (agreement_id,) + wait_for_credentials(did, ocean, timeout)
+
+
+def wait_for_credentials(did, ocean=None, timeout=60):
+    """
+    Decrypt the asset credentials once access is granted
+    """
+    from ocean_cli.api.conditions import check_permissions
+
+    for _ in backoff(timeout):
+        if check_permissions(did, ocean=ocean):
+            service_endpoint, secret = credentials(ocean, did)
+            if isinstance(secret, dict):
+                return service_endpoint, secret
+            print(secret)
+    return None, None
+
+
+def backoff(timeout, interval=0.25, max_interval=4):
+    """
+    Yield until timeout, sleeping exponentially longer between attempts
+    """
+    deadline = time.time() + timeout
+    while True:
+        yield
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return
+        time.sleep(min(interval, remaining))
+        interval = min(interval * 2, max_interval)
 
 
 def credentials(ocean, did):
@@ -117,27 +144,88 @@ def consume(did,
             service_endpoint,
             secret,
             method='get',
+            download=True,
+            progress=None,
             ocean=None):
     url = secret.get('url', None)
     if method == 'get':
+        if download:
+            return consume_download(url, get_asset_folder(did),
+                                    progress=progress)
         return consume_get(url)
     elif method == 'api':
         return consume_api(ocean, did, service_endpoint, url)
 
 
-def consume_agreement(ocean, agreement_id, method):
+def consume_agreement(ocean, agreement_id, method, download=True,
+                      progress=None):
     agreement = ocean.agreements.get(agreement_id)
     did = id_to_did(agreement.did)
     service_endpoint, secret = credentials(ocean, did)
-    return consume(did, agreement_id, service_endpoint, secret, method, ocean=ocean)
+    return consume(did, agreement_id, service_endpoint, secret, method,
+                   download=download, progress=progress, ocean=ocean)
 
 
 def consume_get(url):
-    return requests.get(f'{url}')
+    return get_http_client().get(f'{url}')
+
 
+def consume_download(url, folder, chunk_size=1024 * 1024, retries=3,
+                     progress=None):
+    """
+    Stream url into folder with constant memory use
 
-def consume_api(ocean, did, service_endpoint, url):
-    from urllib import parse
+    Data goes to a .part file first. An interrupted download is resumed
+    with an HTTP Range request, here or on the next call. The sha256 of
+    the file is computed while writing. progress(done, total) is called
+    after every chunk.
+    """
+    name = os.path.basename(parse.urlparse(url).path) or 'index.html'
+    path = os.path.join(folder, name)
+    part_path = f'{path}.part'
+    for attempt in range(retries + 1):
+        sha256 = hashlib.sha256()
+        done = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        headers = {'Range': f'bytes={done}-'} if done else {}
+        try:
+            with get_http_client().get(url, headers=headers,
+                                       stream=True) as response:
+                if response.status_code != 416:
+                    # 416: the partial file is already complete
+                    response.raise_for_status()
+                if response.status_code in (206, 416):
+                    with open(part_path, 'rb') as fh:
+                        for chunk in iter(lambda: fh.read(chunk_size), b''):
+                            sha256.update(chunk)
+                    mode = 'ab'
+                else:
+                    done, mode = 0, 'wb'
+                if response.status_code == 416:
+                    break
+                length = response.headers.get('Content-Length')
+                total = done + int(length) if length else None
+                with open(part_path, mode) as fh:
+                    for chunk in response.iter_content(chunk_size):
+                        fh.write(chunk)
+                        sha256.update(chunk)
+                        done += len(chunk)
+                        if progress:
+                            progress(done, total)
+            break
+        except (requests.ConnectionError, requests.exceptions.ChunkedEncodingError) as e:
+            if attempt == retries:
+                raise
+            print(f'download interrupted at {done} bytes, resuming: {e}')
+    os.replace(part_path, path)
+    return {
+        'url': url,
+        'path': path,
+        'size': done,
+        'sha256': sha256.hexdigest()
+    }
+
+
+def consume_api(ocean, did, service_endpoint, url, timeout=300):
     path = url.get('path', 'index.html')
     qs = url.get('qs', '')
     qs_dict = parse.parse_qs(qs)
@@ -145,18 +233,31 @@ def consume_api(ocean, did, service_endpoint, url):
         if qs else None
     qs_token = "&".join([f'{k}={v[0]}' for k, v in qs.items()]) if \
         isinstance(qs, dict) else qs
-    return requests.get(
+    response = get_http_client().get(
         f'{service_endpoint}/{path}'
         f'?signedToken={signed_token}&'
         f'did={did}&'
         f'address={ocean.account.address}&'
         f'{qs_token}'
     )
+    return wait_for_job(response, timeout)
 
 
-def consume_brizo(ocean, account, did, agreement_id, token):
-    service_endpoint = get_service_endpoint(ocean, did)
+def wait_for_job(response, timeout=300):
+    """
+    Follow a 202 from the proxy job queue until the job has a result
+    """
+    if response.status_code != 202 or 'Location' not in response.headers:
+        return response
+    job_url = parse.urljoin(response.url, response.headers['Location'])
+    for _ in backoff(timeout, max_interval=2):
+        response = get_http_client().get(job_url)
+        if response.status_code != 202:
+            return response
+    raise ValueError(f'{job_url} not done after {timeout}s')
+
 
+def get_asset_folder(did):
     destination = ConfigProvider.get_config().downloads_path
     if not os.path.isabs(destination):
         destination = os.path.abspath(destination)
@@ -166,6 +267,12 @@ def consume_brizo(ocean, account, did, agreement_id, token):
     asset_folder = os.path.join(destination, f'datafile.{did_to_id(did)}')
     if not os.path.exists(asset_folder):
         os.mkdir(asset_folder)
+    return asset_folder
+
+
+def consume_brizo(ocean, account, did, agreement_id, token):
+    service_endpoint = get_service_endpoint(ocean, did)
+    asset_folder = get_asset_folder(did)
 
     BrizoProvider.get_brizo().consume_service(
         agreement_id,
@@ -199,7 +306,28 @@ def add_providers(account, did, provider):
     if provider == 'me':
         provider = account.address
     did_registry = Keeper.get_instance().did_registry
-    return did_registry.add_provider(did_to_id(did), provider, account)
+    response = did_registry.add_provider(did_to_id(did), provider, account)
+    index = get_asset_index()
+    if response and index:
+        index.add_provider(did, provider)
+    return response
+
+
+def get_owner(did):
+    index = get_asset_index()
+    if index and index.refresh():
+        owner = index.get_owner(did)
+        if owner:
+            return owner
+    return Keeper.get_instance().did_registry.get_did_owner(did_to_id(did))
+
+
+def get_providers(did):
+    index = get_asset_index()
+    if index and index.refresh() and index.get_owner(did):
+        return index.get_providers(did)
+    return Keeper.get_instance().did_registry\
+        .get_did_providers(did_to_id(did))
 
 
 def search(text, pretty=False, ocean=None):
@@ -230,7 +358,7 @@ def order(did, ocean=None):
         ocean.account.address,
         ocean=ocean
     )
-    lock_reward(ocean, ocean.account, agreement_id)
+    lock_reward(ocean, ocean.account, agreement_id, sa.get_price())
 
     return agreement_id
 
@@ -264,23 +392,40 @@ def decrypt(did, ocean=None):
     return decrypted_content_urls
 
 
-def list_assets(address=None, ocean=None):
+def list_assets(address=None, workers=8, ocean=None):
+    index = get_asset_index()
+    if index and index.refresh():
+        if address == 'me':
+            address = ocean.account.address
+        return index.list(owner=address)
+    return list(iter_assets(address, workers, ocean=ocean))
+
+
+def iter_assets(address=None, workers=8, ocean=None):
+    """
+    Yield registered DIDs, optionally only those owned by address
+
+    Owners are read from the DIDRegistry on a bounded thread pool; DIDs are
+    yielded in registry order as soon as their owner is known.
+    """
     did_list = [id_to_did(Web3Provider.get_web3().toHex(_id)[2:]) for _id in
                 DIDRegistry.get_instance().contract_concise.getDIDRegisterIds()]
 
-    if address:
-        if address == 'me':
-            address = ocean.account.address
-        result = []
-        for did in did_list:
-            try:
-                asset_owner = ocean.assets.resolve(did).as_dictionary()['publicKey'][0]['owner']
-                if asset_owner == address:
-                    result += [did]
-            except ValueError:
-                pass
-        return result
-    return did_list
+    if not address:
+        yield from did_list
+        return
+
+    if address == 'me':
+        address = ocean.account.address
+    did_registry = Keeper.get_instance().did_registry
+
+    def get_owner(did):
+        return did_registry.get_did_owner(did_to_id(did))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for did, owner in zip(did_list, executor.map(get_owner, did_list)):
+            if owner and owner.lower() == address.lower():
+                yield did
 
 
 def get_service_endpoint(ocean, did):
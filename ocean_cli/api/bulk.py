@@ -0,0 +1,156 @@
+import copy
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from ocean_cli.api.assets import create, wait_for_credentials
+from ocean_cli.api.agreements import get_agreement_from_did
+from ocean_cli.api.conditions import check_permissions, ensure_budget
+
+
+def load_manifest(path):
+    if path and os.path.exists(path):
+        with open(path, 'r') as fh:
+            return json.load(fh)
+    return {}
+
+
+def save_manifest(path, manifest):
+    if not path:
+        return
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as fh:
+        json.dump(manifest, fh, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def publish_files(files,
+                  metadata,
+                  workers=4,
+                  manifest=None,
+                  ocean=None,
+                  **kwargs):
+    """
+    Publish one asset per file, `workers` at a time
+
+    Encryption, DIDRegistry transactions and Aquarius writes run
+    concurrently; the transactions are sent with personal_sendTransaction,
+    so the node assigns their nonces. Every published file is recorded in
+    the manifest with its DID; files already in the manifest are skipped,
+    so an interrupted run can be resumed.
+    """
+    published = load_manifest(manifest)
+    todo = [f for f in files if f not in published]
+    failed = {}
+    lock = threading.Lock()
+
+    def publish_file(f):
+        file_metadata = copy.deepcopy(metadata)
+        file_metadata['base']['files'][0]['url'] = f
+        return create(file_metadata, ocean=ocean, **kwargs)
+
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(publish_file, f): f for f in todo}
+        for future in as_completed(futures):
+            f = futures[future]
+            try:
+                did = future.result()
+            except Exception as e:
+                failed[f] = str(e)
+                print(f'failed: {f}: {e}')
+                continue
+            print(f'published: {f} {did}')
+            with lock:
+                published[f] = did
+                save_manifest(manifest, published)
+    elapsed = time.time() - started
+
+    done = len(todo) - len(failed)
+    return {
+        'published': {f: published[f] for f in todo if f in published},
+        'skipped': len(files) - len(todo),
+        'failed': failed,
+        'elapsed': round(elapsed, 3),
+        'per_second': round(done / elapsed, 3) if elapsed else 0
+    }
+
+
+def pull_asset(did, method='get', timeout=60, retries=2, ocean=None):
+    """
+    Order, wait for access and download one asset, with per phase timings
+
+    A failed attempt is retried without ordering the asset again.
+    """
+    result = {'did': did, 'status': 'failed', 'agreement': None,
+              'attempts': 0, 'error': None,
+              'timings': {'order': 0, 'access_wait': 0, 'download': 0}}
+    timings = result['timings']
+    ordered = False
+    for _ in range(retries + 1):
+        result['attempts'] += 1
+        try:
+            started = time.time()
+            if not ordered and not check_permissions(did, ocean=ocean):
+                result['agreement'] = ocean.order(did)
+            ordered = True
+            timings['order'] += time.time() - started
+
+            started = time.time()
+            service_endpoint, secret = wait_for_credentials(did, ocean,
+                                                            timeout)
+            timings['access_wait'] += time.time() - started
+            if secret is None:
+                raise ValueError(f'no access after {timeout}s')
+
+            started = time.time()
+            ocean.consume(did, result['agreement'], service_endpoint, secret,
+                          method=method)
+            timings['download'] += time.time() - started
+            result['status'] = 'success'
+            result['error'] = None
+            break
+        except Exception as e:
+            result['error'] = str(e)
+            print(f'retry: {did}: {e}')
+    result['timings'] = {k: round(v, 3) for k, v in timings.items()}
+    return result
+
+
+def pull_assets(dids, method='get', workers=4, timeout=60, retries=2,
+                ocean=None):
+    """
+    Consume several assets concurrently, `workers` at a time
+
+    The prices of the assets still to order are approved once up front,
+    so the concurrent orders do not each replace the allowance.
+    """
+    results = []
+    started = time.time()
+    to_order = [did for did in dids
+                if not check_permissions(did, ocean=ocean)]
+    if to_order:
+        ensure_budget(ocean.account,
+                      sum(int(get_agreement_from_did(ocean, did).get_price())
+                          for did in to_order))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(pull_asset, did, method, timeout, retries,
+                                   ocean=ocean) for did in dids]
+        for future in as_completed(futures):
+            result = future.result()
+            print(f"{result['status']}: {result['did']} {result['timings']}")
+            results.append(result)
+
+    totals = {
+        phase: round(sum(r['timings'][phase] for r in results), 3)
+        for phase in ('order', 'access_wait', 'download')
+    }
+    return {
+        'assets': sorted(results, key=lambda r: dids.index(r['did'])),
+        'succeeded': sum(r['status'] == 'success' for r in results),
+        'failed': sum(r['status'] != 'success' for r in results),
+        'timings': totals,
+        'elapsed': round(time.time() - started, 3)
+    }
@@ -0,0 +1,181 @@
+import threading
+import time
+from collections import OrderedDict
+
+from squid_py.ddo.ddo import DDO
+from squid_py.did import did_to_id
+from squid_py.keeper import Keeper
+from squid_py.keeper.web3_provider import Web3Provider
+
+from ocean_cli.api.storage import config_path, config_value, sqlite_connection
+
+
+class LRUCache:
+    """
+    Thread-safe in-memory LRU with optional per-entry TTL
+    """
+
+    def __init__(self, maxsize=256, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires is None or expires > time.time():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires = time.time() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def invalidate_matching(self, predicate):
+        with self._lock:
+            for key in [key for key in self._entries if predicate(key)]:
+                del self._entries[key]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        return {
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+
+def get_checksum(did):
+    """
+    Current last_checksum of a DID on the DIDRegistry
+    """
+    register_values = Keeper.get_instance().did_registry.contract_concise\
+        .getDIDRegister(did_to_id(did))
+    if not register_values:
+        return None
+    return Web3Provider.get_web3().toHex(register_values[1])
+
+
+class DDOCache:
+    """
+    Caches resolved DDOs in memory and, optionally, in a sqlite file
+
+    Entries expire after `ttl` seconds and, in memory as on disk, are only
+    used while the DID's last_checksum on the DIDRegistry is unchanged, so
+    a hit costs one eth_call instead of a request to Aquarius.
+    """
+
+    def __init__(self, resolver, maxsize=256, ttl=300, path=None):
+        self._resolver = resolver
+        self._memory = LRUCache(maxsize, ttl)
+        self.ttl = ttl
+        self.path = path
+        self.disk_hits = 0
+        self.resolves = 0
+        if self.path:
+            with sqlite_connection(self.path) as connection:
+                connection.execute(
+                    'CREATE TABLE IF NOT EXISTS ddo_cache ('
+                    'did TEXT PRIMARY KEY, checksum TEXT, '
+                    'fetched_at REAL, ddo TEXT)')
+
+    def resolve(self, did):
+        checksum = get_checksum(did)
+        entry = self._memory.get(did)
+        if entry is not None and entry[0] == checksum:
+            return entry[1]
+        ddo = self._load(did, checksum)
+        if ddo is not None:
+            self.disk_hits += 1
+        else:
+            self.resolves += 1
+            ddo = self._resolver(did)
+            self._store(did, checksum, ddo)
+        self._memory.set(did, (checksum, ddo))
+        return ddo
+
+    def invalidate(self, did=None):
+        self._memory.invalidate(did)
+        if self.path:
+            with sqlite_connection(self.path) as connection:
+                if did is None:
+                    connection.execute('DELETE FROM ddo_cache')
+                else:
+                    connection.execute(
+                        'DELETE FROM ddo_cache WHERE did = ?', (did,))
+
+    def _load(self, did, checksum):
+        if not self.path:
+            return None
+        with sqlite_connection(self.path) as connection:
+            row = connection.execute(
+                'SELECT checksum, fetched_at, ddo FROM ddo_cache '
+                'WHERE did = ?', (did,)).fetchone()
+        if not row:
+            return None
+        stored_checksum, fetched_at, text = row
+        if fetched_at + self.ttl < time.time() \
+                or stored_checksum != checksum:
+            self.invalidate(did)
+            return None
+        return DDO(json_text=text)
+
+    def _store(self, did, checksum, ddo):
+        if not self.path:
+            return
+        with sqlite_connection(self.path) as connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO ddo_cache VALUES (?, ?, ?, ?)',
+                (did, checksum, time.time(), ddo.as_text()))
+
+    def stats(self):
+        memory = self._memory.stats()
+        return {
+            'memory_hits': memory['hits'],
+            'disk_hits': self.disk_hits,
+            'misses': self.resolves,
+            'saved_requests': memory['hits'] + self.disk_hits,
+            'size': memory['size']
+        }
+
+
+_ddo_cache = None
+
+
+def get_ddo_cache(resolver=None):
+    """
+    Process-wide DDO cache, configured from the [resources] section
+    """
+    global _ddo_cache
+    if _ddo_cache is None:
+        _ddo_cache = DDOCache(
+            resolver,
+            maxsize=int(config_value('ddo_cache.size', 256)),
+            ttl=int(config_value('ddo_cache.ttl', 300)),
+            path=config_path('ddo_cache.path')
+        )
+    return _ddo_cache
@@ -1,30 +1,97 @@
+import threading
 import time
+from collections import defaultdict
+from functools import partial
 
+from eth_utils import add_0x_prefix
 from ocean_cli.api.agreements import get_agreement_from_id, list_agreements
-from squid_py.did import id_to_did, did_to_id_bytes
+from ocean_cli.api.transactions import TransactionPipeline
+from squid_py.did import id_to_did, did_to_id, did_to_id_bytes
 from squid_py.keeper import Keeper
+from squid_py.keeper.web3_provider import Web3Provider
 from squid_py.ocean.ocean_conditions import OceanConditions
 
+# ConditionStoreManager state of a fulfilled condition
+CONDITION_FULFILLED = 2
 
-def lock_reward(ocean, account, agreement_id):
+# approve replaces the allowance instead of adding to it, so checking it,
+# approving and sending the lock are done under one lock, and tokens of
+# locks sent but not mined yet are reserved per account
+_allowance_lock = threading.Lock()
+_reserved = defaultdict(int)
+
+
+def get_allowance(account):
+    """
+    Tokens the LockRewardCondition may still transfer from account
+    """
     keeper = Keeper.get_instance()
-    ocean_conditions = OceanConditions(keeper)
-    amount = int(get_agreement_from_id(ocean, agreement_id).get_price())
-    keeper.token.token_approve(keeper.lock_reward_condition.address,
-                               amount,
-                               account)
-    return ocean_conditions.lock_reward(agreement_id, amount, account)
+    return keeper.token.contract_concise.allowance(
+        account.address, keeper.lock_reward_condition.address)
+
+
+def approve_budget(account, amount):
+    """
+    Approve enough tokens up front to lock the rewards of several orders
+    """
+    keeper = Keeper.get_instance()
+    return keeper.token.token_approve(keeper.lock_reward_condition.address,
+                                      int(amount),
+                                      account)
+
+
+def _ensure_budget(account, amount):
+    """
+    Approve amount on top of the pending locks if the allowance is short
+
+    Must be called with _allowance_lock held.
+    """
+    reserved = _reserved[account.address]
+    if get_allowance(account) - reserved < amount:
+        approve_budget(account, reserved + amount)
+
+
+def ensure_budget(account, amount):
+    """
+    Make sure the allowance covers amount besides the pending locks
+    """
+    with _allowance_lock:
+        _ensure_budget(account, int(amount))
+
+
+def lock_reward(ocean, account, agreement_id, price=None):
+    """
+    Lock the reward, approving tokens only if the allowance is too low
+
+    OceanConditions.lock_reward always approves exactly the price, which
+    costs a transaction and replaces any budget approved up front.
+    """
+    keeper = Keeper.get_instance()
+    if price is None:
+        price = get_agreement_from_id(ocean, agreement_id).get_price()
+    amount = int(price)
+    with _allowance_lock:
+        _ensure_budget(account, amount)
+        tx_hash = keeper.lock_reward_condition.fulfill(
+            agreement_id, keeper.escrow_reward_condition.address, amount,
+            account)
+        _reserved[account.address] += amount
+    try:
+        receipt = keeper.lock_reward_condition.get_tx_receipt(tx_hash)
+    finally:
+        with _allowance_lock:
+            _reserved[account.address] -= amount
+    return bool(receipt and receipt.status == 1)
 
 
-def access(ocn, account, agreement_id, consumer):
+def access(ocn, account, agreement_id, consumer, max_in_flight=16):
     if agreement_id == 'all':
-        response = False
-        for _agreement_id in list_agreements(ocn, account, account.address):
-            try:
-                response = access(ocn, account, _agreement_id, consumer)
-            except Exception as e:
-                print(e)
-        return response
+        pipeline = TransactionPipeline(account, max_in_flight)
+        for _agreement_id in list_agreements(account.address, ocean=ocn):
+            pipeline.submit(_agreement_id,
+                            partial(prepare_access, ocn, _agreement_id,
+                                    consumer))
+        return pipeline.close()
     ocean_conditions = OceanConditions(Keeper.get_instance())
     agreement = ocn.agreements.get(agreement_id)
     return ocean_conditions.grant_access(agreement_id,
@@ -38,15 +105,46 @@ def check_permissions(did, address=None, ocean=None):
     return access_.check_permissions(did_to_id_bytes(did), address)
 
 
-def release_reward(agreement_id, ocean=None):
+def prepare_access(ocn, agreement_id, consumer):
+    keeper = Keeper.get_instance()
+    agreement = ocn.agreements.get(agreement_id)
+    access_id = agreement.condition_ids[0]
+    if keeper.condition_manager.get_condition_state(access_id) \
+            == CONDITION_FULFILLED:
+        return None
+    return keeper.access_secret_store_condition, 'fulfill', (
+        agreement_id,
+        add_0x_prefix(did_to_id(id_to_did(agreement.did))),
+        consumer
+    )
+
+
+def prepare_release_reward(ocean, agreement_id):
+    keeper = Keeper.get_instance()
+    agreement = ocean.agreements.get(agreement_id)
+    access_id, lock_id, escrow_id = agreement.condition_ids[:3]
+    if keeper.condition_manager.get_condition_state(escrow_id) \
+            == CONDITION_FULFILLED:
+        return None
+    amount = int(get_agreement_from_id(ocean, agreement_id).get_price())
+    consumer, _ = keeper.escrow_access_secretstore_template\
+        .get_agreement_data(agreement_id)
+    # the escrow condition pays the DID owner, not the access provider
+    owner = Web3Provider.get_web3().toChecksumAddress(agreement.owner)
+    return keeper.escrow_reward_condition, 'fulfill', (
+        agreement_id, amount, owner, consumer, lock_id, access_id
+    )
+
+
+def release_reward(agreement_id, ocean=None, max_in_flight=16):
     if agreement_id == 'all':
-        response = False
-        for _agreement_id in list_agreements(ocean.account.address, ocean=ocean):
-            try:
-                response = release_reward(_agreement_id, ocean=ocean)
-            except Exception as e:
-                print(e)
-        return response
+        pipeline = TransactionPipeline(ocean.account, max_in_flight)
+        for _agreement_id in list_agreements(ocean.account.address,
+                                             ocean=ocean):
+            pipeline.submit(_agreement_id,
+                            partial(prepare_release_reward, ocean,
+                                    _agreement_id))
+        return pipeline.close()
     amount = int(get_agreement_from_id(ocean, agreement_id).get_price())
     ocean_conditions = OceanConditions(Keeper.get_instance())
     return ocean_conditions.release_reward(
@@ -1,23 +1,49 @@
 import time
+import traceback
 
 from squid_py.did import id_to_did
 from squid_py.keeper.web3_provider import Web3Provider
 from ocean_cli.api.conditions import release_reward
+from ocean_cli.api.logs import LogIngester
+from ocean_cli.api.state import AgreementRecord, get_state_store
+from ocean_cli.api.storage import config_path, config_value
+from ocean_cli.api.workers import KeyedWorkerPool
 from squid_py.ocean.ocean_conditions import OceanConditions
 
 from squid_py.keeper import Keeper
 
-# global: bad practice
-agreements = {}
+
+def is_stored(agreement):
+    """
+    Whether get_agreement returned an agreement that exists on chain
+
+    squid returns the DID as a '0x...' string, zero for unknown ids.
+    """
+    return bool(agreement) and int(agreement.did, 16) != 0
+
+
+def wait_for_agreement(ocean, agreement_id, timeout=30, interval=0.2):
+    """
+    Wait until the agreement is readable from the AgreementStoreManager
+    """
+    deadline = time.time() + timeout
+    while True:
+        agreement = ocean.agreements.get(agreement_id)
+        if is_stored(agreement):
+            return agreement
+        if time.time() > deadline:
+            raise ValueError(f'agreement {agreement_id} not found '
+                             f'after {timeout}s')
+        time.sleep(interval)
+        interval = min(interval * 2, 2)
 
 
 def handle_agreement_created(event=None, agreement_id=None, ocean=None,
                              *args, **kwargs):
-    time.sleep(3)
     consumer = event['args'].get('_accessConsumer', None)
     provider = event['args'].get('_accessProvider', None)
     if provider == ocean.account.address:
-        did = id_to_did(ocean.agreements.get(agreement_id).did)
+        did = id_to_did(wait_for_agreement(ocean, agreement_id).did)
         return {
             'did': did,
             'consumer': consumer,
@@ -25,6 +51,21 @@ def handle_agreement_created(event=None, agreement_id=None, ocean=None,
         }
 
 
+def load_agreement(ocean, agreement_id):
+    """
+    Rebuild the record of an agreement served by this provider from chain
+    """
+    agreement = ocean.agreements.get(agreement_id)
+    if not is_stored(agreement):
+        return None
+    consumer, provider = ocean.keeper.escrow_access_secretstore_template\
+        .get_agreement_data(agreement_id)
+    if provider != ocean.account.address:
+        return None
+    return AgreementRecord(id_to_did(agreement.did), consumer, provider,
+                           time.time())
+
+
 def handle_lock_reward(agreement_id=None, agreement=None, ocean=None,
                        *args, **kwargs):
     ocean_conditions = OceanConditions(Keeper.get_instance())
@@ -44,50 +85,85 @@ def handle_lock_reward(agreement_id=None, agreement=None, ocean=None,
 
 def listen_lock_reward(callback_agreement_created=handle_agreement_created,
                        callback_lock_reward=handle_lock_reward,
+                       from_block=None,
+                       workers=4,
+                       store=None,
+                       max_retry_delay=60,
                        ocean=None):
+    """
+    Serve agreements: grant access and release the reward once locked
+
+    Events are handled on a pool of `workers` threads. Events of the same
+    agreement are handled in order, on the same thread. A failed event is
+    retried on its thread with backoff up to max_retry_delay seconds
+    apart, and keeps the checkpoint below its block until it has been
+    handled.
+    """
     template = ocean.keeper.escrow_access_secretstore_template.get_instance()
     lock_reward = ocean.keeper.lock_reward_condition.get_instance()
-    filters = [
-        template.events.AgreementCreated.createFilter(fromBlock='latest'),
-        lock_reward.events.Fulfilled.createFilter(fromBlock='latest'),
-    ]
+    ingester = LogIngester(
+        f'lock_reward:{ocean.account.address}',
+        [template.events.AgreementCreated, lock_reward.events.Fulfilled],
+        path=config_path('events.path'),
+        from_block=from_block
+    )
+    if store is None:
+        store = get_state_store(config_path('state.path'),
+                                int(config_value('state.ttl', 86400)))
+    pool = KeyedWorkerPool(workers, name='agreement')
+    in_flight = {}
 
-    while True:
-        for _filter in filters:
+    def handle_event(event, agreement_id):
+        # retried on this worker, so later events of the agreement wait
+        attempt = 0
+        while True:
             try:
-                for event in _filter.get_new_entries():
-                    print(f"\n\n{'*'*30}\nEVENT: {event['event']}\n{'*'*30}\n\n", event)
-                    agreement_id = Web3Provider.get_web3().toHex(
-                        event['args'].get('_agreementId', None)
-                    )
-
-                    print(ocean.agreements.status(agreement_id))
-
-                    if event['event'] == 'AgreementCreated':
-                        agreements[agreement_id] = \
-                            callback_agreement_created(event=event,
-                                                       agreement_id=agreement_id,
-                                                       ocean=ocean)
-                    elif event['event'] == 'Fulfilled':
-                        if agreement_id in agreements:
-                            agreement = agreements[agreement_id]
-                            callback_lock_reward(event=event,
-                                                 agreement_id=agreement_id,
-                                                 agreement=agreement,
-                                                 ocean=ocean)
-                            del agreements[agreement_id]
-                        else:
-                            # todo clean error handling
-                            print(f'error: agreement {agreement_id} '
-                                  f'not in {agreements}')
-                    print(ocean.agreements.status(agreement_id))
-            except ValueError as e:
-                print('error', e)
-                # avoid hangup, refresh filters
-                filters = [
-                    template.events.AgreementCreated.createFilter(
-                        fromBlock='latest'),
-                    lock_reward.events.Fulfilled.createFilter(
-                        fromBlock='latest'),
-                ]
-        time.sleep(0.1)
+                _handle_event(event, agreement_id)
+                break
+            except Exception as e:
+                traceback.print_exc()
+                delay = min(2 ** attempt, max_retry_delay)
+                print(f'retry in {delay}s: {agreement_id}: {e}')
+                time.sleep(delay)
+                attempt += 1
+        try:
+            ingester.mark_seen(event)
+        finally:
+            del in_flight[id(event)]
+
+    def _handle_event(event, agreement_id):
+        print(f"\n\n{'*'*30}\nEVENT: {event['event']}\n{'*'*30}\n\n", event)
+        if event['event'] == 'AgreementCreated':
+            agreement = callback_agreement_created(event=event,
+                                                   agreement_id=agreement_id,
+                                                   ocean=ocean)
+            if agreement:
+                store.put(agreement_id, AgreementRecord(
+                    agreement['did'], agreement['consumer'],
+                    agreement['provider'], time.time()))
+                print(agreement_id, ocean.agreements.status(agreement_id))
+        elif event['event'] == 'Fulfilled':
+            record = store.get(agreement_id) \
+                or load_agreement(ocean, agreement_id)
+            if record:
+                callback_lock_reward(event=event,
+                                     agreement_id=agreement_id,
+                                     agreement=record._asdict(),
+                                     ocean=ocean)
+                store.delete(agreement_id)
+                print(agreement_id, ocean.agreements.status(agreement_id))
+            else:
+                print(f'skip: agreement {agreement_id} '
+                      f'is not served by {ocean.account.address}')
+
+    def dispatch(event):
+        agreement_id = Web3Provider.get_web3().toHex(
+            event['args'].get('_agreementId', None)
+        )
+        in_flight[id(event)] = event['blockNumber']
+        pool.submit(agreement_id, handle_event, event, agreement_id)
+
+    def pending():
+        return min(list(in_flight.values()), default=None)
+
+    ingester.run(dispatch, auto_mark=False, pending=pending)
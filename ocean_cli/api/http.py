@@ -0,0 +1,101 @@
+import threading
+import time
+from urllib import parse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from ocean_cli.api.storage import config_value
+
+
+class HttpClient:
+    """
+    Pooled keep-alive HTTP session shared by every module
+
+    Idempotent requests are retried with backoff, every request gets a
+    default timeout and the latency is recorded per host.
+    """
+
+    def __init__(self, pool_size=10, timeout=(5, 60), retries=3,
+                 backoff_factor=0.3):
+        self.timeout = timeout
+        self.session = requests.Session()
+        retry = Retry(total=retries,
+                      backoff_factor=backoff_factor,
+                      status_forcelist=(502, 503, 504),
+                      method_whitelist=frozenset(['GET', 'HEAD', 'OPTIONS']),
+                      raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=pool_size,
+                              pool_maxsize=pool_size,
+                              max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._latency = {}
+        self._lock = threading.Lock()
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        host = parse.urlparse(url).netloc
+        started = time.time()
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except requests.RequestException:
+            self._record(host, time.time() - started, error=True)
+            raise
+        self._record(host, time.time() - started)
+        return response
+
+    def _record(self, host, elapsed, error=False):
+        with self._lock:
+            stats = self._latency.setdefault(
+                host, {'requests': 0, 'errors': 0, 'total': 0, 'max': 0})
+            if error:
+                stats['errors'] += 1
+                return
+            stats['requests'] += 1
+            stats['total'] += elapsed
+            stats['max'] = max(stats['max'], elapsed)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request('PUT', url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request('DELETE', url, **kwargs)
+
+    def stats(self):
+        with self._lock:
+            return {
+                host: {
+                    'requests': stats['requests'],
+                    'errors': stats['errors'],
+                    'mean_ms': round(1000 * stats['total']
+                                     / max(stats['requests'], 1), 1),
+                    'max_ms': round(1000 * stats['max'], 1)
+                }
+                for host, stats in self._latency.items()
+            }
+
+
+_http_client = None
+
+
+def get_http_client():
+    """
+    Process-wide HTTP client, configured from the [resources] section
+    """
+    global _http_client
+    if _http_client is None:
+        _http_client = HttpClient(
+            pool_size=int(config_value('http.pool_size', 10)),
+            timeout=(float(config_value('http.connect_timeout', 5)),
+                     float(config_value('http.read_timeout', 60))),
+            retries=int(config_value('http.retries', 3))
+        )
+    return _http_client
@@ -0,0 +1,203 @@
+from squid_py.did import id_to_did, did_to_id
+from squid_py.keeper import Keeper
+from squid_py.keeper.web3_provider import Web3Provider
+
+from ocean_cli.api.storage import config_path, config_value, sqlite_connection
+
+
+# bumped when the index needs events it did not read before; an index
+# built by an older version is rebuilt from the first block
+INDEX_VERSION = 2
+
+
+class AssetIndex:
+    """
+    Local sqlite index of DIDRegistry assets
+
+    Filled from DIDAttributeRegistered, DIDProviderAdded and
+    DIDProviderRemoved events, starting after the last block that was
+    processed.
+    """
+
+    def __init__(self, path, max_lag=0, chunk_size=10000):
+        self.path = path
+        self.max_lag = max_lag
+        self.chunk_size = chunk_size
+        with sqlite_connection(self.path) as connection:
+            connection.executescript(
+                'CREATE TABLE IF NOT EXISTS assets ('
+                'did TEXT PRIMARY KEY, owner TEXT, checksum TEXT, '
+                'block_number INTEGER);'
+                'CREATE INDEX IF NOT EXISTS assets_owner '
+                'ON assets (owner COLLATE NOCASE);'
+                'CREATE TABLE IF NOT EXISTS providers ('
+                'did TEXT, provider TEXT, PRIMARY KEY (did, provider));'
+                'CREATE TABLE IF NOT EXISTS meta ('
+                'key TEXT PRIMARY KEY, value INTEGER);')
+            row = connection.execute(
+                "SELECT value FROM meta WHERE key = 'version'").fetchone()
+            if not row or row[0] < INDEX_VERSION:
+                connection.executescript(
+                    'DELETE FROM assets; DELETE FROM providers; '
+                    'DELETE FROM meta;')
+                connection.execute(
+                    "INSERT INTO meta VALUES ('version', ?)",
+                    (INDEX_VERSION,))
+
+    @property
+    def last_block(self):
+        with sqlite_connection(self.path) as connection:
+            row = connection.execute(
+                "SELECT value FROM meta WHERE key = 'last_block'").fetchone()
+        return row[0] if row else -1
+
+    def lag(self):
+        return Web3Provider.get_web3().eth.blockNumber - self.last_block
+
+    def is_behind(self):
+        return self.lag() > self.max_lag
+
+    @staticmethod
+    def _get_entries(event, from_block, to_block):
+        web3 = Web3Provider.get_web3()
+        _filter = event.createFilter(fromBlock=from_block, toBlock=to_block)
+        entries = _filter.get_all_entries()
+        web3.eth.uninstallFilter(_filter.filter_id)
+        return entries
+
+    def sync(self, to_block=None):
+        """
+        Process DIDRegistry events up to to_block (latest)
+        """
+        web3 = Web3Provider.get_web3()
+        did_registry = Keeper.get_instance().did_registry
+        events = did_registry.get_instance().events
+        events = (events.DIDAttributeRegistered, events.DIDProviderAdded,
+                  events.DIDProviderRemoved)
+        to_block = web3.eth.blockNumber if to_block is None else to_block
+        from_block = self.last_block + 1
+        processed = 0
+        while from_block <= to_block:
+            chunk_end = min(from_block + self.chunk_size - 1, to_block)
+            entries = sorted(
+                (entry for event in events
+                 for entry in self._get_entries(event, from_block, chunk_end)),
+                key=lambda entry: (entry['blockNumber'], entry['logIndex']))
+
+            rows = {}
+            # (did, provider, added) in chain order
+            changes = []
+            for entry in entries:
+                args = entry['args']
+                did = id_to_did(web3.toHex(args['_did'])[2:])
+                if entry['event'] == 'DIDAttributeRegistered':
+                    rows[did] = (did,
+                                 args['_owner'],
+                                 web3.toHex(args['_checksum']),
+                                 entry['blockNumber'])
+                elif entry['event'] == 'DIDProviderAdded':
+                    changes.append((did, args['_provider'], True))
+                elif args['state']:
+                    changes.append((did, args['_provider'], False))
+            providers = [
+                (did, provider) for did in rows
+                for provider in did_registry.get_did_providers(did_to_id(did))
+            ]
+            with sqlite_connection(self.path) as connection:
+                connection.executemany(
+                    'INSERT OR REPLACE INTO assets VALUES (?, ?, ?, ?)',
+                    rows.values())
+                connection.executemany(
+                    'DELETE FROM providers WHERE did = ?',
+                    [(did,) for did in rows])
+                connection.executemany(
+                    'INSERT OR IGNORE INTO providers VALUES (?, ?)',
+                    providers)
+                for did, provider, added in changes:
+                    connection.execute(
+                        'INSERT OR IGNORE INTO providers VALUES (?, ?)'
+                        if added else
+                        'DELETE FROM providers WHERE did = ? AND provider = ?',
+                        (did, provider))
+                connection.execute(
+                    "INSERT OR REPLACE INTO meta VALUES ('last_block', ?)",
+                    (chunk_end,))
+            processed += len(entries)
+            from_block = chunk_end + 1
+        return {
+            'events': processed,
+            'last_block': to_block
+        }
+
+    def refresh(self):
+        """
+        Catch up with the chain if behind, return whether the index is usable
+        """
+        try:
+            latest = Web3Provider.get_web3().eth.blockNumber
+            if latest - self.last_block > self.max_lag:
+                self.sync(latest)
+        except ValueError as e:
+            print('index sync failed:', e)
+            return False
+        return True
+
+    def list(self, owner=None):
+        with sqlite_connection(self.path) as connection:
+            if owner:
+                rows = connection.execute(
+                    'SELECT did FROM assets WHERE owner = ? COLLATE NOCASE '
+                    'ORDER BY block_number, did', (owner,))
+            else:
+                rows = connection.execute(
+                    'SELECT did FROM assets ORDER BY block_number, did')
+            return [row[0] for row in rows]
+
+    def get_owner(self, did):
+        with sqlite_connection(self.path) as connection:
+            row = connection.execute(
+                'SELECT owner FROM assets WHERE did = ?', (did,)).fetchone()
+        return row[0] if row else None
+
+    def get_providers(self, did):
+        with sqlite_connection(self.path) as connection:
+            rows = connection.execute(
+                'SELECT provider FROM providers WHERE did = ?', (did,))
+            return [row[0] for row in rows]
+
+    def add_provider(self, did, provider):
+        with sqlite_connection(self.path) as connection:
+            connection.execute(
+                'INSERT OR IGNORE INTO providers VALUES (?, ?)',
+                (did, provider))
+
+    def status(self):
+        with sqlite_connection(self.path) as connection:
+            assets = connection.execute(
+                'SELECT COUNT(*) FROM assets').fetchone()[0]
+        return {
+            'path': self.path,
+            'assets': assets,
+            'last_block': self.last_block,
+            'lag': self.lag()
+        }
+
+
+_asset_index = None
+
+
+def get_asset_index():
+    """
+    Process-wide asset index, None unless index.path is configured
+    """
+    global _asset_index
+    if _asset_index is None:
+        path = config_path('index.path')
+        if not path:
+            return None
+        _asset_index = AssetIndex(
+            path,
+            max_lag=int(config_value('index.max_lag', 0)),
+            chunk_size=int(config_value('index.chunk_size', 10000))
+        )
+    return _asset_index
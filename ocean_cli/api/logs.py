@@ -0,0 +1,180 @@
+import threading
+import time
+
+from eth_utils import event_abi_to_log_topic
+from requests.exceptions import ConnectionError, Timeout
+from squid_py.keeper.web3_provider import Web3Provider
+from web3.utils.events import get_event_data
+
+from ocean_cli.api.storage import sqlite_connection
+
+
+class LogIngester:
+    """
+    Reads contract events with eth_getLogs over block ranges
+
+    The last processed block is checkpointed, so a restart (or an RPC
+    error) resumes where it stopped instead of at 'latest'. Ranges shrink
+    when the node rejects them and grow again while it keeps up. Events are
+    deduplicated by (transactionHash, logIndex).
+    """
+
+    def __init__(self, name, events, path=None, from_block=None,
+                 chunk_size=1000, max_chunk_size=10000, confirmations=0):
+        self.name = name
+        self.path = path
+        self.chunk_size = chunk_size
+        self.max_chunk_size = max_chunk_size
+        self.confirmations = confirmations
+        self._web3 = Web3Provider.get_web3()
+        self._abis = {}
+        self._addresses = []
+        for event in events:
+            abi = event._get_event_abi()
+            topic = self._web3.toHex(event_abi_to_log_topic(abi))
+            self._abis[topic] = abi
+            if event.address not in self._addresses:
+                self._addresses.append(event.address)
+        # marked from worker threads while the poll thread prunes it
+        self._seen = set()
+        self._seen_lock = threading.Lock()
+        if self.path:
+            with sqlite_connection(self.path) as connection:
+                connection.executescript(
+                    'CREATE TABLE IF NOT EXISTS checkpoints ('
+                    'name TEXT PRIMARY KEY, block INTEGER);'
+                    'CREATE TABLE IF NOT EXISTS seen_logs ('
+                    'name TEXT, tx_hash TEXT, log_index INTEGER, '
+                    'block INTEGER, PRIMARY KEY (name, tx_hash, log_index));')
+        self._checkpoint = self._load_checkpoint()
+        if self._checkpoint is None:
+            if from_block is None:
+                from_block = self._web3.eth.blockNumber
+            self._checkpoint = from_block - 1
+        self._cursor = self._checkpoint
+
+    @property
+    def checkpoint(self):
+        return self._checkpoint
+
+    def _load_checkpoint(self):
+        if not self.path:
+            return None
+        with sqlite_connection(self.path) as connection:
+            row = connection.execute(
+                'SELECT block FROM checkpoints WHERE name = ?',
+                (self.name,)).fetchone()
+        return row[0] if row else None
+
+    def _save_checkpoint(self, block):
+        if block <= self._checkpoint:
+            return
+        self._checkpoint = block
+        # entries below the checkpoint can no longer be returned
+        with self._seen_lock:
+            self._seen = {key for key in self._seen if key[2] > block}
+        if not self.path:
+            return
+        with sqlite_connection(self.path) as connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO checkpoints VALUES (?, ?)',
+                (self.name, block))
+            connection.execute(
+                'DELETE FROM seen_logs WHERE name = ? AND block <= ?',
+                (self.name, block))
+
+    def _is_seen(self, key):
+        with self._seen_lock:
+            if key in self._seen:
+                return True
+        if not self.path:
+            return False
+        with sqlite_connection(self.path) as connection:
+            return connection.execute(
+                'SELECT 1 FROM seen_logs '
+                'WHERE name = ? AND tx_hash = ? AND log_index = ?',
+                (self.name, key[0], key[1])).fetchone() is not None
+
+    def _event_key(self, event):
+        return (self._web3.toHex(event['transactionHash']),
+                event['logIndex'],
+                event['blockNumber'])
+
+    def mark_seen(self, event):
+        key = self._event_key(event)
+        with self._seen_lock:
+            self._seen.add(key)
+        if not self.path:
+            return
+        with sqlite_connection(self.path) as connection:
+            connection.execute(
+                'INSERT OR IGNORE INTO seen_logs VALUES (?, ?, ?, ?)',
+                (self.name,) + key)
+
+    def get_logs(self, from_block, to_block):
+        logs = self._web3.eth.getLogs({
+            'fromBlock': from_block,
+            'toBlock': to_block,
+            'address': self._addresses,
+            'topics': [list(self._abis)]
+        })
+        events = [
+            get_event_data(self._abis[self._web3.toHex(log['topics'][0])],
+                           log)
+            for log in logs
+        ]
+        return sorted(events,
+                      key=lambda e: (e['blockNumber'], e['logIndex']))
+
+    def poll(self, auto_mark=True, pending=None):
+        """
+        Yield every new event up to the head of the chain
+
+        An event is marked as processed when the caller asks for the next
+        one, unless auto_mark is off and the caller uses mark_seen itself.
+        The checkpoint moves after each completed block range. If pending
+        is given, it returns the lowest block still being handled by the
+        caller and the checkpoint stays below it.
+        """
+        head = self._web3.eth.blockNumber - self.confirmations
+        while self._cursor < head:
+            from_block = self._cursor + 1
+            to_block = min(from_block + self.chunk_size - 1, head)
+            try:
+                events = self.get_logs(from_block, to_block)
+            except ValueError as e:
+                if self.chunk_size == 1:
+                    raise
+                print(f'getLogs {from_block}-{to_block} failed: {e}')
+                self.chunk_size = max(1, self.chunk_size // 2)
+                continue
+
+            for event in events:
+                if self._is_seen(self._event_key(event)):
+                    continue
+                yield event
+                if auto_mark:
+                    self.mark_seen(event)
+            self._cursor = to_block
+            self._save_checkpoint(self._safe_block(pending))
+            self.chunk_size = min(self.chunk_size * 2, self.max_chunk_size)
+        self._save_checkpoint(self._safe_block(pending))
+
+    def _safe_block(self, pending):
+        lowest = pending() if pending else None
+        if lowest is None:
+            return self._cursor
+        return min(self._cursor, lowest - 1)
+
+    def run(self, callback, poll_interval=0.5, max_backoff=30,
+            auto_mark=True, pending=None):
+        backoff = poll_interval
+        while True:
+            try:
+                for event in self.poll(auto_mark, pending):
+                    callback(event)
+                backoff = poll_interval
+            except (ConnectionError, Timeout, ValueError) as e:
+                print('error', e)
+                backoff = min(backoff * 2, max_backoff)
+            time.sleep(backoff)
@@ -0,0 +1,99 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from ocean_cli.api.storage import sqlite_connection
+
+AgreementRecord = namedtuple('AgreementRecord',
+                             ('did', 'consumer', 'provider', 'created_at'))
+
+
+class MemoryStateStore:
+    """
+    Pending agreements kept in memory, oldest first
+    """
+
+    def __init__(self, ttl=86400, maxsize=10000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._records = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, agreement_id):
+        return self._records.get(agreement_id)
+
+    def put(self, agreement_id, record):
+        with self._lock:
+            self._records[agreement_id] = record
+            self._records.move_to_end(agreement_id)
+            while len(self._records) > self.maxsize:
+                self._records.popitem(last=False)
+        self.evict()
+
+    def delete(self, agreement_id):
+        with self._lock:
+            self._records.pop(agreement_id, None)
+
+    def evict(self):
+        expired = time.time() - self.ttl
+        with self._lock:
+            while self._records:
+                agreement_id, record = next(iter(self._records.items()))
+                if record.created_at > expired:
+                    break
+                del self._records[agreement_id]
+
+    def __len__(self):
+        return len(self._records)
+
+
+class SqliteStateStore:
+    """
+    Pending agreements kept in a sqlite file, surviving restarts
+    """
+
+    def __init__(self, path, ttl=86400):
+        self.path = path
+        self.ttl = ttl
+        with sqlite_connection(self.path) as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS agreements ('
+                'agreement_id TEXT PRIMARY KEY, did TEXT, consumer TEXT, '
+                'provider TEXT, created_at REAL)')
+
+    def get(self, agreement_id):
+        with sqlite_connection(self.path) as connection:
+            row = connection.execute(
+                'SELECT did, consumer, provider, created_at FROM agreements '
+                'WHERE agreement_id = ?', (agreement_id,)).fetchone()
+        return AgreementRecord(*row) if row else None
+
+    def put(self, agreement_id, record):
+        with sqlite_connection(self.path) as connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO agreements VALUES (?, ?, ?, ?, ?)',
+                (agreement_id,) + tuple(record))
+        self.evict()
+
+    def delete(self, agreement_id):
+        with sqlite_connection(self.path) as connection:
+            connection.execute(
+                'DELETE FROM agreements WHERE agreement_id = ?',
+                (agreement_id,))
+
+    def evict(self):
+        with sqlite_connection(self.path) as connection:
+            connection.execute(
+                'DELETE FROM agreements WHERE created_at < ?',
+                (time.time() - self.ttl,))
+
+    def __len__(self):
+        with sqlite_connection(self.path) as connection:
+            return connection.execute(
+                'SELECT COUNT(*) FROM agreements').fetchone()[0]
+
+
+def get_state_store(path=None, ttl=86400):
+    if path:
+        return SqliteStateStore(path, ttl)
+    return MemoryStateStore(ttl)
@@ -0,0 +1,37 @@
+import os
+import sqlite3
+from contextlib import contextmanager
+
+from squid_py import ConfigProvider
+
+
+def config_value(key, fallback=None, section='resources'):
+    """
+    Read an optional value from the active config file
+    """
+    try:
+        config = ConfigProvider.get_config()
+    except AssertionError:
+        # no config loaded yet
+        return fallback
+    return config.get(section, key, fallback=fallback)
+
+
+def config_path(key, fallback=None):
+    path = config_value(key, fallback)
+    if path and not os.path.isabs(path):
+        path = os.path.abspath(path)
+    return path
+
+
+@contextmanager
+def sqlite_connection(path):
+    """
+    Short-lived sqlite connection, committed on success
+    """
+    connection = sqlite3.connect(path, timeout=30)
+    try:
+        yield connection
+        connection.commit()
+    finally:
+        connection.close()
@@ -0,0 +1,173 @@
+import heapq
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from squid_py.keeper.web3_provider import Web3Provider
+
+
+class NonceManager:
+    """
+    Hands out nonces locally so transactions can be sent without waiting
+
+    Nonces of transactions that could not be sent are handed out again
+    before new ones.
+    """
+
+    def __init__(self, address, web3=None):
+        self.address = address
+        self._web3 = web3 or Web3Provider.get_web3()
+        self._next = None
+        self._released = []
+        self._lock = threading.Lock()
+
+    def next(self):
+        with self._lock:
+            if self._released:
+                return heapq.heappop(self._released)
+            if self._next is None:
+                self._next = self._web3.eth.getTransactionCount(
+                    self.address, 'pending')
+            nonce = self._next
+            self._next += 1
+            return nonce
+
+    def release(self, nonce):
+        with self._lock:
+            heapq.heappush(self._released, nonce)
+
+    def gaps(self):
+        """
+        Released nonces below the highest one handed out
+        """
+        with self._lock:
+            gaps = sorted(self._released)
+            self._released = []
+            while gaps and gaps[-1] == self._next - 1:
+                self._next = gaps.pop()
+            return gaps
+
+
+class TransactionPipeline:
+    """
+    Keeps up to max_in_flight transactions of one account pending
+
+    Each submitted task prepares a contract call, gets a local nonce, sends
+    it and waits for the receipt on its own thread. A transaction that is
+    not mined within `timeout` is replaced with the same nonce and a higher
+    gas price, up to `retries` times.
+    """
+
+    def __init__(self, account, max_in_flight=16, timeout=120, retries=2,
+                 gas_price_bump=1.2, poll_interval=1):
+        self.account = account
+        self.timeout = timeout
+        self.retries = retries
+        self.gas_price_bump = gas_price_bump
+        self.poll_interval = poll_interval
+        self._web3 = Web3Provider.get_web3()
+        self.nonces = NonceManager(account.address, self._web3)
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight)
+        self._futures = OrderedDict()
+
+    def submit(self, key, prepare):
+        """
+        Queue prepare(), which returns (contract, fn_name, args) or None
+        when there is nothing to send for key
+        """
+        self._futures[key] = self._executor.submit(self._run, key, prepare)
+
+    def close(self):
+        """
+        Wait for every transaction and return one summary per key
+        """
+        try:
+            summary = [future.result() for future in self._futures.values()]
+        finally:
+            self._executor.shutdown()
+            self._fill_gaps()
+        return summary
+
+    def _fill_gaps(self):
+        for nonce in self.nonces.gaps():
+            # unblock later nonces with an empty transaction
+            try:
+                self._web3.personal.sendTransaction({
+                    'from': self.account.address,
+                    'to': self.account.address,
+                    'value': 0,
+                    'nonce': nonce
+                }, self.account.password)
+            except Exception as e:
+                print(f'could not fill nonce {nonce}: {e}')
+
+    def _send(self, contract, fn_name, args, nonce, gas_price):
+        return contract.send_transaction(fn_name, args, transact={
+            'from': self.account.address,
+            'passphrase': self.account.password,
+            'nonce': nonce,
+            'gasPrice': gas_price
+        })
+
+    def _wait(self, tx_hashes):
+        deadline = time.time() + self.timeout
+        while time.time() < deadline:
+            for tx_hash in tx_hashes:
+                try:
+                    receipt = self._web3.eth.getTransactionReceipt(tx_hash)
+                except Exception:
+                    # the transaction is sent, keep polling until deadline
+                    continue
+                if receipt:
+                    return receipt
+            time.sleep(self.poll_interval)
+        return None
+
+    def _run(self, key, prepare):
+        """
+        Send the prepared call, never raises: errors end up in the summary
+        """
+        result = {'id': key, 'status': 'failed', 'tx': None, 'error': None}
+        try:
+            self._execute(prepare, result)
+        except Exception as e:
+            result['status'] = 'failed'
+            result['error'] = str(e) or repr(e)
+        return result
+
+    def _execute(self, prepare, result):
+        started = time.time()
+        call = prepare()
+        if call is None:
+            result['status'] = 'skipped'
+            return
+
+        contract, fn_name, args = call
+        nonce = self.nonces.next()
+        tx_hashes = []
+        try:
+            gas_price = self._web3.eth.gasPrice
+            for _ in range(self.retries + 1):
+                try:
+                    tx_hashes.append(
+                        self._send(contract, fn_name, args, nonce, gas_price))
+                except Exception:
+                    if not tx_hashes:
+                        raise
+                    # the replacement was refused, keep waiting for the others
+                receipt = self._wait(tx_hashes)
+                if receipt:
+                    result['tx'] = self._web3.toHex(receipt.transactionHash)
+                    result['elapsed'] = round(time.time() - started, 3)
+                    if receipt.status == 1:
+                        result['status'] = 'success'
+                    else:
+                        result['error'] = 'transaction reverted'
+                    return
+                gas_price = int(gas_price * self.gas_price_bump)
+        except Exception:
+            if not tx_hashes:
+                self.nonces.release(nonce)
+            raise
+        result['error'] = f'not mined after {self.retries} replacements'
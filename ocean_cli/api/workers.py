@@ -0,0 +1,59 @@
+import queue
+import threading
+import traceback
+import zlib
+
+
+class KeyedWorkerPool:
+    """
+    Runs tasks on a fixed set of threads, serially per key
+
+    Tasks with the same key always go to the same worker, so they run in
+    submission order; tasks with different keys run concurrently.
+    """
+
+    def __init__(self, workers=4, name='worker'):
+        self._queues = [queue.Queue() for _ in range(workers)]
+        self._threads = [
+            threading.Thread(target=self._work, args=(q,),
+                             name=f'{name}-{i}', daemon=True)
+            for i, q in enumerate(self._queues)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    @property
+    def size(self):
+        return len(self._queues)
+
+    def submit(self, key, fn, *args, **kwargs):
+        index = zlib.crc32(str(key).encode()) % len(self._queues)
+        self._queues[index].put((fn, args, kwargs))
+
+    def join(self):
+        """
+        Block until every submitted task has finished
+        """
+        for q in self._queues:
+            q.join()
+
+    def shutdown(self):
+        self.join()
+        for q in self._queues:
+            q.put(None)
+        for thread in self._threads:
+            thread.join()
+
+    @staticmethod
+    def _work(q):
+        while True:
+            task = q.get()
+            try:
+                if task is None:
+                    return
+                fn, args, kwargs = task
+                fn(*args, **kwargs)
+            except Exception:
+                traceback.print_exc()
+            finally:
+                q.task_done()
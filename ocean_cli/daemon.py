@@ -0,0 +1,94 @@
+import hashlib
+import json
+import os
+import socket
+import socketserver
+import sys
+import tempfile
+
+# commands that run for a long time or manage the daemon stay local
+LOCAL_COMMANDS = {'daemon', 'events'}
+
+
+def get_socket_path(config_file):
+    """
+    One socket per (working directory, config file), so relative paths in
+    arguments mean the same thing to the client and the daemon
+    """
+    key = f'{os.getcwd()}\0{os.path.abspath(config_file)}'
+    digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+    return os.path.join(tempfile.gettempdir(),
+                        f'ocean-cli-{os.getuid()}-{digest}.sock')
+
+
+def forward(config_file, args):
+    """
+    Run a command on the daemon, return its exit code or None when there is
+    no daemon for this config file
+    """
+    path = get_socket_path(config_file)
+    if not os.path.exists(path):
+        return None
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(path)
+    except (ConnectionRefusedError, FileNotFoundError):
+        return None
+    with client, client.makefile('rwb') as stream:
+        stream.write(json.dumps({'args': args}).encode() + b'\n')
+        stream.flush()
+        line = stream.readline()
+    if not line:
+        return None
+    response = json.loads(line)
+    sys.stdout.write(response['stdout'])
+    sys.stderr.write(response['stderr'])
+    return response['exit_code']
+
+
+class DaemonHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        from ocean_cli.runner import run_command
+
+        request = json.loads(self.rfile.readline())
+        exit_code, stdout, stderr = run_command(request['args'],
+                                                self.server.obj)
+        self.wfile.write(json.dumps({
+            'exit_code': exit_code,
+            'stdout': stdout,
+            'stderr': stderr
+        }).encode() + b'\n')
+
+
+class DaemonServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, obj):
+        self.obj = obj
+        super().__init__(path, DaemonHandler)
+
+
+def serve(config_file, ocean):
+    """
+    Serve CLI commands for config_file with a warm (Lazy)Ocean instance
+    """
+    path = get_socket_path(config_file)
+    if os.path.exists(path):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+            raise RuntimeError(f'a daemon is already listening on {path}')
+        except ConnectionRefusedError:
+            # left over from a daemon that did not shut down
+            os.unlink(path)
+        finally:
+            probe.close()
+    server = DaemonServer(path, {'ocean': ocean})
+    os.chmod(path, 0o600)
+    print(f'ocean daemon listening on {path}')
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.unlink(path)
@@ -1,25 +1,43 @@
 import os
 import click
+import configparser
 import json
 import logging
 import re
+import sys
+import threading
 import time
 from functools import partial
 
-from squid_py import ConfigProvider
-from squid_py.accounts.account import Account
-from squid_py.config import Config
-from squid_py.did import id_to_did, did_to_id, DID
-from squid_py.keeper import Keeper, Token
-from squid_py.keeper.web3_provider import Web3Provider
-from squid_py.ocean.ocean import Ocean
+from ocean_cli.daemon import LOCAL_COMMANDS, forward
 
+# squid_py pulls in web3 and the keeper contracts, so it is only imported
+# by the commands that talk to the network
 
-def get_ocean(config_file):
+
+def load_config(config_file):
+    from squid_py import ConfigProvider
+    from squid_py.config import Config
     ConfigProvider.set_config(Config(filename=config_file))
+    return ConfigProvider.get_config()
+
+
+def get_ocean(config_file):
+    from squid_py.aquarius.aquarius_provider import AquariusProvider
+    from squid_py.brizo.brizo import Brizo
+    from squid_py.ocean.ocean import Ocean
+    config = load_config(config_file)
     ocn = Ocean()
-    ocn.account = get_default_account(ConfigProvider.get_config())
+    ocn.account = get_default_account(config)
     ocn.balance = partial(ocn.accounts.balance, ocn.account)
+    from ocean_cli.api.cache import get_ddo_cache
+    ocn.ddo_cache = get_ddo_cache(ocn.assets.resolve)
+    ocn.assets.resolve = ocn.ddo_cache.resolve
+    from ocean_cli.api.http import get_http_client
+    ocn.http = get_http_client()
+    Brizo.set_http_client(ocn.http)
+    from ocean_cli.api.aquarius import PooledAquarius
+    AquariusProvider.set_aquarius_class(PooledAquarius)
     from ocean_cli.api.assets import (
         authorize,
         consume,
@@ -44,6 +62,8 @@ def get_ocean(config_file):
 
 
 def get_default_account(config):
+    from squid_py.accounts.account import Account
+    from squid_py.keeper.web3_provider import Web3Provider
     account_address = config.get('keeper-contracts', 'account.address')
     account_password = config.get('keeper-contracts', 'account.password')
     account = Account(
@@ -52,6 +72,49 @@ def get_default_account(config):
     return account
 
 
+class LazyOcean:
+    """
+    Stands in for get_ocean(config_file) until a command uses it
+    """
+
+    def __init__(self, config_file):
+        self.config_file = config_file
+        self._ocean = None
+        self._config = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_built(self):
+        return self._ocean is not None
+
+    def get(self):
+        if self._ocean is None:
+            with self._lock:
+                if self._ocean is None:
+                    self._ocean = get_ocean(self.config_file)
+        return self._ocean
+
+    def load_config(self):
+        """
+        Set the squid config without building Ocean, for keeper-only calls
+        """
+        if self._ocean is None and self._config is None:
+            self._config = load_config(self.config_file)
+
+    @property
+    def account_address(self):
+        if self._ocean is not None:
+            return self._ocean.account.address
+        from eth_utils import to_checksum_address
+        config = configparser.ConfigParser()
+        config.read(self.config_file)
+        return to_checksum_address(
+            config.get('keeper-contracts', 'account.address'))
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+
 @click.pass_context
 def format_dict(ctx, response_dict):
     response = json.dumps(response_dict, indent=2, sort_keys=True)
@@ -78,8 +141,10 @@ def echo(response):
               default='./config.ini', show_default=True)
 @click.option('--as-json', '-j', is_flag=True)
 @click.option('--verbose', '-v', is_flag=True)
+@click.option('--no-daemon', is_flag=True,
+              help='Run here even if an ocean daemon is listening')
 @click.pass_context
-def ocean(ctx, config_file, as_json, verbose):
+def ocean(ctx, config_file, as_json, verbose, no_daemon):
     """
     Simple CLI for registering and consuming assets in Ocean Protocol
 
@@ -92,13 +157,29 @@ def ocean(ctx, config_file, as_json, verbose):
 \____/\__/\__/\_,_/_//_/  \___/____/___/           '*qf/P    '</
                                                      '<)       '
     """
+    if ctx.obj is None and not no_daemon \
+            and ctx.invoked_subcommand not in LOCAL_COMMANDS:
+        exit_code = forward(config_file, sys.argv[1:])
+        if exit_code is not None:
+            ctx.exit(exit_code)
+
     if not verbose:
         logging.getLogger().setLevel(logging.ERROR)
 
     ctx.obj = {
-        'ocean': get_ocean(config_file),
+        'ocean': (ctx.obj or {}).get('ocean') or LazyOcean(config_file),
         'json': as_json
     }
+    if verbose:
+        ctx.call_on_close(partial(print_stats, ctx.obj['ocean']))
+
+
+def print_stats(ocean):
+    if not ocean.is_built:
+        return
+    click.echo(f"ddo cache: {ocean.ddo_cache.stats()}", err=True)
+    for host, stats in ocean.http.stats().items():
+        click.echo(f"http {host}: {stats}", err=True)
 
 
 @ocean.group()
@@ -112,9 +193,8 @@ def accounts():
 @accounts.command('get')
 @click.pass_context
 def accounts_get(ctx):
-    account = ctx.obj['ocean'].account
     echo({
-        'address': account.address
+        'address': ctx.obj['ocean'].account_address
     })
 
 
@@ -122,6 +202,7 @@ def accounts_get(ctx):
 @click.option('-a', '--address')
 @click.pass_context
 def accounts_balance(ctx, address):
+    from squid_py.accounts.account import Account
     ocean = ctx.obj['ocean']
     balance_account = ocean.account
     if address:
@@ -154,6 +235,7 @@ def tokens():
 @click.argument('amount')
 @click.pass_context
 def token_request(ctx, amount):
+    from squid_py.keeper import Token
     ocean = ctx.obj['ocean']
     account = ocean.account
     result = ocean.tokens.request(account, int(amount))
@@ -174,6 +256,7 @@ def token_transfer(ctx, amount, to):
     """
     Transfer OCEAN token to address
     """
+    from squid_py.keeper import Token
     ocean = ctx.obj['ocean']
     account = ocean.account
     ocean.tokens.transfer(to, int(amount), account)
@@ -190,6 +273,23 @@ def token_transfer(ctx, amount, to):
     })
 
 
+@tokens.command('approve')
+@click.argument('amount')
+@click.pass_context
+def token_approve(ctx, amount):
+    """
+    Pre-approve OCEAN token for locking the rewards of several orders
+    """
+    from .api.conditions import approve_budget, get_allowance
+    account = ctx.obj['ocean'].account
+    result = approve_budget(account, amount)
+    echo({
+        'address': account.address,
+        'allowance': get_allowance(account),
+        'result': result
+    })
+
+
 @ocean.group()
 def assets():
     """
@@ -219,20 +319,34 @@ def assets_publish(ctx, metadata, brizo, price, service_endpoint, timeout):
     echo(response)
 
 
+def print_progress(done, total):
+    if total:
+        click.echo(f'\r{done}/{total} bytes ({100 * done // total}%)',
+                   nl=done == total, err=True)
+    else:
+        click.echo(f'\r{done} bytes', nl=False, err=True)
+
+
 @assets.command('consume')
 @click.argument('did')
 @click.option('--method', '-m', default='get', show_default=True,
               type=click.Choice(['get', 'api', 'brizo']))
+@click.option('--timeout', '-t', default=60, show_default=True,
+              help='Seconds to wait for access to be granted')
+@click.option('--print-body', is_flag=True,
+              help='Print a small payload instead of downloading it')
 @click.pass_context
-def assets_consume(ctx, did, method):
+def assets_consume(ctx, did, method, timeout, print_body):
     """
     Consume asset: create Service Agreement, lock reward, [wait], decrypt & download
     """
     ocean = ctx.obj['ocean']
     response = ocean.consume(did,
-                             *ocean.authorize(did),
-                             method=method)
-    if method in ['get', 'api']:
+                             *ocean.authorize(did, timeout=timeout),
+                             method=method,
+                             download=not print_body,
+                             progress=print_progress)
+    if method == 'api' or (method == 'get' and print_body):
         try:
             response = response.json()
         except json.decoder.JSONDecodeError:
@@ -247,44 +361,56 @@ def assets_consume(ctx, did, method):
 @click.option('--price', '-p', default=0)
 @click.option('--service-endpoint', '-s', default='http://localhost:8000')
 @click.option('--timeout', '-t', default=3600)
+@click.option('--workers', '-w', default=4, show_default=True)
+@click.option('--manifest', '-m', default='ocean-push.json', show_default=True,
+              type=click.Path(), help='File -> DID record used to resume')
 @click.pass_context
-def assets_push(ctx, metadata, dir, brizo, price, service_endpoint, timeout):
+def assets_push(ctx, metadata, dir, brizo, price, service_endpoint, timeout,
+                workers, manifest):
     """
     Publish all files in current directory
     """
+    from .api.bulk import publish_files
     try:
-        files = [f for f in os.listdir(dir) if os.path.isfile(dir+'/'+f)]
+        files = [f for f in os.listdir(dir) if os.path.isfile(dir+'/'+f)
+                 and os.path.abspath(dir+'/'+f) != os.path.abspath(manifest)]
     except NotADirectoryError:
         files = [dir]
 
-    response = []
     metadata = json.load(open(metadata, 'r'))
-
-    for f in files:
-        metadata['base']['files'][0]['url'] = f
-        response += [ctx.invoke(assets_publish,
-                                metadata=metadata,
-                                brizo=brizo,
-                                price=price,
-                                service_endpoint=service_endpoint,
-                                timeout=timeout)]
+    response = publish_files(sorted(files),
+                             metadata,
+                             workers=workers,
+                             manifest=manifest,
+                             secret_store=not brizo,
+                             price=price,
+                             service_endpoint=service_endpoint,
+                             timeout=timeout,
+                             ocean=ctx.obj['ocean'])
+    echo(response)
 
 
 @assets.command('pull')
 @click.argument('text')
 @click.option('--method', '-m', default='get', show_default=True)
+@click.option('--workers', '-w', default=4, show_default=True)
+@click.option('--timeout', '-t', default=60, show_default=True,
+              help='Seconds to wait for access to each asset')
+@click.option('--retries', '-r', default=2, show_default=True)
 @click.pass_context
-def assets_pull(ctx, text, method):
+def assets_pull(ctx, text, method, workers, timeout, retries):
     """
     Consume all assets on TEXT search
     """
+    from .api.bulk import pull_assets
     ocean = ctx.obj['ocean']
-    response = []
-    for did in ocean.search(text):
-        print('pulling:', did)
-        response += [ctx.invoke(assets_consume,
-                                did=did,
-                                method=method)]
+    response = pull_assets(ocean.search(text),
+                           method=method,
+                           workers=workers,
+                           timeout=timeout,
+                           retries=retries,
+                           ocean=ocean)
+    echo(response)
 
 
 @assets.command('add-providers')
@@ -301,24 +427,30 @@ def assets_add_providers(ctx, did, provider):
 
 @assets.command('get-providers')
 @click.argument('did')
-def assets_get_providers(did):
-    response = Keeper.get_instance().did_registry\
-        .get_did_providers(did_to_id(did))
+@click.pass_context
+def assets_get_providers(ctx, did):
+    from .api.assets import get_providers
+    ctx.obj['ocean'].load_config()
+    response = get_providers(did)
     echo(response)
 
 
 @assets.command('get-owner')
 @click.argument('did')
-def assets_get_owner(did):
-    response = Keeper.get_instance().did_registry\
-        .get_did_owner(did_to_id(did))
+@click.pass_context
+def assets_get_owner(ctx, did):
+    from .api.assets import get_owner
+    ctx.obj['ocean'].load_config()
+    response = get_owner(did)
     echo(response)
 
 
 @assets.command('get')
 @click.argument('did')
-def assets_get(did):
+@click.pass_context
+def assets_get(ctx, did):
     from .api.assets import get
+    ctx.obj['ocean'].load_config()
     response = get(did)
     echo(response)
 
@@ -361,14 +493,18 @@ def assets_decrypt(ctx, did):
 @assets.command('consume-agreement')
 @click.argument('agreement_id')
 @click.option('--method', '-m', default='get', show_default=True)
+@click.option('--print-body', is_flag=True,
+              help='Print a small payload instead of downloading it')
 @click.pass_context
-def assets_consume_agreement(ctx, agreement_id, method):
+def assets_consume_agreement(ctx, agreement_id, method, print_body):
     """
     Consume agreement: decrypt and download
     """
     from .api.assets import consume_agreement
-    response = consume_agreement(ctx.obj['ocean'], agreement_id, method)
-    if method in ['get', 'api']:
+    response = consume_agreement(ctx.obj['ocean'], agreement_id, method,
+                                 download=not print_body,
+                                 progress=print_progress)
+    if method == 'api' or (method == 'get' and print_body):
         try:
             response = response.json()
         except json.decoder.JSONDecodeError:
@@ -389,15 +525,57 @@ def assets_resolve(ctx, did):
 
 @assets.command('list')
 @click.option('-a', '--address')
+@click.option('--workers', '-w', default=8, show_default=True)
+@click.option('--stream', '-s', is_flag=True)
 @click.pass_context
-def assets_list(ctx, address):
+def assets_list(ctx, address, workers, stream):
     """
     List assets on-chain
     """
-    response = ctx.obj['ocean'].assets.list(address)
+    ocean = ctx.obj['ocean']
+    if stream:
+        from .api.assets import iter_assets
+        for did in iter_assets(address, workers, ocean=ocean):
+            click.echo(did)
+        return
+    response = ocean.assets.list(address, workers)
     echo(response)
 
 
+@ocean.group()
+def index():
+    """
+    Maintain the local asset index
+    """
+    pass
+
+
+@index.command('sync')
+@click.option('--to-block', '-t', type=int)
+@click.pass_context
+def index_sync(ctx, to_block):
+    """
+    Backfill the index from DIDRegistry events
+    """
+    from .api.index import get_asset_index
+    ctx.obj['ocean'].load_config()
+    asset_index = get_asset_index()
+    if not asset_index:
+        raise click.UsageError('index.path is not set in the config file')
+    echo(asset_index.sync(to_block))
+
+
+@index.command('status')
+@click.pass_context
+def index_status(ctx):
+    from .api.index import get_asset_index
+    ctx.obj['ocean'].load_config()
+    asset_index = get_asset_index()
+    if not asset_index:
+        raise click.UsageError('index.path is not set in the config file')
+    echo(asset_index.status())
+
+
 @ocean.group()
 def agreements():
     """
@@ -408,10 +586,12 @@ def agreements():
 
 @agreements.command('list')
 @click.argument('did_or_address')
+@click.option('--workers', '-w', default=8, show_default=True)
 @click.pass_context
-def agreements_list(ctx, did_or_address):
+def agreements_list(ctx, did_or_address, workers):
     from ocean_cli.api.agreements import list_agreements
-    response = list_agreements(did_or_address, ctx.obj['ocean'])
+    response = list(list_agreements(did_or_address, ctx.obj['ocean'],
+                                    workers))
     echo(response)
 
 
@@ -452,6 +632,7 @@ def agreements_prepare(ctx, did, service_id):
 @click.argument('signature', default='')
 @click.pass_context
 def agreements_create_prepared(ctx, agreement_id, service_id, signature):
+    from squid_py.did import id_to_did
     ocean = ctx.obj['ocean']
     agreement = ocean.agreements.get(agreement_id)
     result = ocean.agreements.create(id_to_did(agreement.did),
@@ -504,13 +685,14 @@ def conditions():
 
 @conditions.command('lock-reward')
 @click.argument('agreement_id')
-@click.argument('amount')
+@click.argument('amount', required=False)
 @click.pass_context
-def conditions_lock_reward(ctx, agreement_id):
+def conditions_lock_reward(ctx, agreement_id, amount):
     from .api.conditions import lock_reward
     ocean = ctx.obj['ocean']
     response = lock_reward(ocean, ocean.account,
-                           agreement_id)
+                           agreement_id,
+                           amount)
     echo({
         "response": response
     })
@@ -519,13 +701,16 @@ def conditions_lock_reward(ctx, agreement_id):
 @conditions.command('access')
 @click.argument('agreement_id')
 @click.argument('consumer')
+@click.option('--max-in-flight', '-n', default=16, show_default=True,
+              help='Pending transactions when AGREEMENT_ID is all')
 @click.pass_context
-def conditions_access(ctx, agreement_id, consumer):
+def conditions_access(ctx, agreement_id, consumer, max_in_flight):
     from .api.conditions import access
     ocean = ctx.obj['ocean']
     response = access(ocean, ocean.account,
                       agreement_id,
-                      consumer)
+                      consumer,
+                      max_in_flight)
     echo({
         "response": response
     })
@@ -533,11 +718,14 @@ def conditions_access(ctx, agreement_id, consumer):
 
 @conditions.command('release-reward')
 @click.argument('agreement_id')
+@click.option('--max-in-flight', '-n', default=16, show_default=True,
+              help='Pending transactions when AGREEMENT_ID is all')
 @click.pass_context
-def conditions_release_reward(ctx, agreement_id):
+def conditions_release_reward(ctx, agreement_id, max_in_flight):
     from .api.conditions import release_reward
     ocean = ctx.obj['ocean']
-    response = release_reward(agreement_id, ocean=ocean)
+    response = release_reward(agreement_id, ocean=ocean,
+                              max_in_flight=max_in_flight)
     echo({
         "response": response
     })
@@ -591,10 +779,15 @@ def listen(ctx):
 
 
 @events.command('access')
+@click.option('--from-block', '-f', type=int,
+              help='Block to start from when there is no checkpoint')
+@click.option('--workers', '-w', default=4, show_default=True)
 @click.pass_context
-def access(ctx):
+def access(ctx, from_block, workers):
     from ocean_cli.api.events import listen_lock_reward
-    listen_lock_reward(ocean=ctx.obj['ocean'])
+    listen_lock_reward(from_block=from_block,
+                       workers=workers,
+                       ocean=ctx.obj['ocean'])
 
 
 @ocean.group()
@@ -609,6 +802,7 @@ def secretstore():
 @click.argument('plain_text')
 @click.pass_context
 def encrypt(ctx, plain_text):
+    from squid_py.did import did_to_id, DID
     ocean, account = ctx.obj['ocean'], ctx.obj['account']
     doc_id = did_to_id(DID.did())
     encrypted_document = ocean.secret_store.encrypt(doc_id, plain_text, account)
@@ -631,6 +825,43 @@ def decrypt(ctx, doc_id, cipher_text):
     })
 
 
+@ocean.command('batch')
+@click.argument('commands', type=click.File('r'))
+@click.option('--workers', '-w', default=1, show_default=True,
+              help='Commands to run at the same time')
+@click.option('--output', '-o', type=click.File('w'), default='-')
+@click.pass_context
+def batch(ctx, commands, workers, output):
+    """
+    Run the commands of a JSONL file in one process
+
+    \b
+    Each line is an object like
+    {"command": "assets get-owner", "args": ["did:op:..."]}
+    Results are written as JSONL, one line per command.
+    """
+    from ocean_cli.runner import run_batch
+    for result in run_batch(commands, {'ocean': ctx.obj['ocean']},
+                            workers):
+        output.write(json.dumps(result) + '\n')
+        output.flush()
+
+
+@ocean.command('daemon')
+@click.pass_context
+def daemon(ctx):
+    """
+    Serve commands from a warm Ocean instance over a Unix socket
+
+    Other ocean invocations with the same config file and working
+    directory are forwarded to it.
+    """
+    from ocean_cli.daemon import serve
+    ocean = ctx.obj['ocean']
+    ocean.get()
+    serve(ocean.config_file, ocean)
+
+
 @ocean.group()
 def notebook():
     """
@@ -0,0 +1,145 @@
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from ocean_cli.api.storage import config_value
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+TIMEOUT = 'timeout'
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, fn, args, kwargs, timeout, respond=None):
+        self.id = uuid.uuid4().hex
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.timeout = timeout
+        self.respond = respond
+        self.status = QUEUED
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.error = None
+
+    def run(self):
+        self.started = time.time()
+        self.status = RUNNING
+        try:
+            result = self.fn(*self.args, **self.kwargs)
+        except Exception as e:
+            traceback.print_exc()
+            self.error, status = str(e), FAILED
+        else:
+            self.result, status = result, DONE
+        self.finished = time.time()
+        # a job that overran its timeout keeps the timeout status
+        if self.status == RUNNING:
+            self.status = status
+
+    def check_timeout(self, now=None):
+        now = now or time.time()
+        if self.status == RUNNING and now - self.started > self.timeout:
+            self.status = TIMEOUT
+            self.finished = now
+        return self.status
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+            'error': self.error
+        }
+
+
+class JobQueue:
+    """
+    Runs slow handlers on a bounded thread pool, tracked by job id
+
+    At most max_pending jobs are queued or running at a time. A job that
+    runs past its timeout is reported as timed out; its thread cannot be
+    interrupted, so it still holds a worker until the call returns.
+    Finished jobs are kept for ttl seconds for polling.
+    """
+
+    def __init__(self, workers=4, max_pending=64, timeout=300, ttl=600):
+        self.timeout = timeout
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers,
+                                            thread_name_prefix='proxy-job')
+
+    def submit(self, fn, *args, timeout=None, respond=None, **kwargs):
+        """
+        Queue fn(*args, **kwargs), returns the job; raises JobQueueFull
+        """
+        job = Job(fn, args, kwargs, timeout or self.timeout, respond)
+        with self._lock:
+            self._purge()
+            if self.pending() >= self.max_pending:
+                raise JobQueueFull(f'{self.max_pending} jobs pending')
+            self._jobs[job.id] = job
+        self._executor.submit(job.run)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            job.check_timeout()
+        return job
+
+    def pending(self):
+        now = time.time()
+        return sum(1 for job in self._jobs.values()
+                   if job.status == QUEUED
+                   or job.check_timeout(now) == RUNNING)
+
+    def _purge(self):
+        now = time.time()
+        for job_id, job in list(self._jobs.items()):
+            if job.finished and now - job.finished > self.ttl:
+                del self._jobs[job_id]
+
+    def stats(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        counts = {}
+        for job in jobs:
+            status = job.check_timeout()
+            counts[status] = counts.get(status, 0) + 1
+        return {
+            'jobs': counts,
+            'max_pending': self.max_pending,
+            'timeout': self.timeout
+        }
+
+
+_job_queue = None
+
+
+def get_job_queue():
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = JobQueue(
+            workers=int(config_value('proxy.jobs.workers', 4)),
+            max_pending=int(config_value('proxy.jobs.max_pending', 64)),
+            timeout=int(config_value('proxy.jobs.timeout', 300)),
+            ttl=int(config_value('proxy.jobs.ttl', 600))
+        )
+    return _job_queue
@@ -0,0 +1,134 @@
+import gzip
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+
+from flask import Response, request
+
+from ocean_cli.api.storage import config_path, config_value
+
+
+class RenderCache:
+    """
+    Rendered pages stored on disk under a hash of everything they depend on
+
+    Each page is kept as-is and gzipped, served with its key as ETag, and
+    the least recently used pages are removed above max_bytes.
+    """
+
+    def __init__(self, path, max_bytes=256 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._locks = {}
+        self._lock = threading.Lock()
+        # renders in progress, out of reach of evict()
+        self.tmp_path = os.path.join(self.path, 'tmp')
+        os.makedirs(self.tmp_path, exist_ok=True)
+
+    @staticmethod
+    def key(*parts):
+        return hashlib.sha256(repr(parts).encode()).hexdigest()
+
+    def file(self, key, suffix='.html'):
+        return os.path.join(self.path, f'{key}{suffix}')
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def get_or_render(self, key, render, suffix='.html'):
+        """
+        Path of the cached page, calling render(path) to write it if needed
+        """
+        path = self.file(key, suffix)
+        with self._key_lock(key):
+            if os.path.exists(path):
+                self.hits += 1
+                os.utime(path)
+                return path
+            self.misses += 1
+            fd, tmp_path = tempfile.mkstemp(suffix=suffix, dir=self.tmp_path)
+            os.close(fd)
+            try:
+                render(tmp_path)
+                with open(tmp_path, 'rb') as src, \
+                        gzip.open(f'{tmp_path}.gz', 'wb') as dst:
+                    shutil.copyfileobj(src, dst)
+                os.replace(f'{tmp_path}.gz', f'{path}.gz')
+                os.replace(tmp_path, path)
+            finally:
+                for leftover in (tmp_path, f'{tmp_path}.gz'):
+                    if os.path.exists(leftover):
+                        os.unlink(leftover)
+        with self._lock:
+            self._locks.pop(key, None)
+        self.evict()
+        return path
+
+    def response(self, key, suffix='.html', mimetype='text/html'):
+        """
+        Serve a cached page, gzipped if accepted, 304 if unchanged
+        """
+        path = self.file(key, suffix)
+        if 'gzip' in request.accept_encodings \
+                and os.path.exists(f'{path}.gz'):
+            with open(f'{path}.gz', 'rb') as fh:
+                response = Response(fh.read(), mimetype=mimetype)
+            response.headers['Content-Encoding'] = 'gzip'
+            response.set_etag(f'{key}.gz')
+        else:
+            with open(path, 'rb') as fh:
+                response = Response(fh.read(), mimetype=mimetype)
+            response.set_etag(key)
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['Cache-Control'] = 'private, max-age=0'
+        return response.make_conditional(request)
+
+    def evict(self):
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.path):
+                if not entry.is_file() or entry.name.endswith('.gz'):
+                    continue
+                path = entry.path
+                try:
+                    stat = os.stat(path)
+                    size = stat.st_size
+                    if os.path.exists(f'{path}.gz'):
+                        size += os.path.getsize(f'{path}.gz')
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, size, path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                for stale in (path, f'{path}.gz'):
+                    if os.path.exists(stale):
+                        os.unlink(stale)
+                total -= size
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'path': self.path
+        }
+
+
+_render_cache = None
+
+
+def get_render_cache():
+    global _render_cache
+    if _render_cache is None:
+        _render_cache = RenderCache(
+            config_path('proxy.render_cache.path', 'proxy-cache'),
+            int(config_value('proxy.render_cache.max_bytes',
+                             256 * 1024 * 1024))
+        )
+    return _render_cache
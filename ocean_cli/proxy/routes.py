@@ -0,0 +1,126 @@
+import importlib
+import threading
+import time
+
+
+class RouteBusy(Exception):
+    pass
+
+
+def resolve(target, package=None):
+    """
+    Import 'module:attribute', relative module names from package
+    """
+    if callable(target):
+        return target
+    module, _, attribute = target.partition(':')
+    return getattr(importlib.import_module(module, package), attribute)
+
+
+class Route:
+    """
+    A proxy path served by a handler that is imported on first use
+
+    At most max_concurrency calls run at a time; a call over the limit is
+    refused with RouteBusy instead of waiting, so a slow route cannot tie
+    up the server. background routes run in the job queue and respond
+    builds the response from the handler result.
+    """
+
+    def __init__(self, path, handler, respond=None, max_concurrency=4,
+                 background=False, params=False, timeout=None, package=None):
+        self.path = path
+        self.background = background
+        self.params = params
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self._targets = {'handler': handler, 'respond': respond}
+        self._package = package
+        self._resolved = {}
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self.active = 0
+        self.calls = 0
+        self.errors = 0
+        self.rejected = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def _resolve(self, name):
+        if name not in self._resolved:
+            target = self._targets[name]
+            self._resolved[name] = target and resolve(target, self._package)
+        return self._resolved[name]
+
+    @property
+    def handler(self):
+        return self._resolve('handler')
+
+    @property
+    def respond(self):
+        return self._resolve('respond')
+
+    def acquire(self):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise RouteBusy(f'{self.path}: {self.max_concurrency} '
+                            f'requests in progress')
+        with self._lock:
+            self.active += 1
+
+    def release(self):
+        with self._lock:
+            self.active -= 1
+        self._slots.release()
+
+    def run(self, *args, **kwargs):
+        """
+        Call the handler in the slot taken by acquire(), and release it
+        """
+        start = time.perf_counter()
+        failed = False
+        try:
+            return self.handler(*args, **kwargs)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.calls += 1
+                self.errors += failed
+                self.total_time += elapsed
+                self.max_time = max(self.max_time, elapsed)
+            self.release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'active': self.active,
+                'max_concurrency': self.max_concurrency,
+                'calls': self.calls,
+                'errors': self.errors,
+                'rejected': self.rejected,
+                'mean_time': self.total_time / self.calls
+                if self.calls else None,
+                'max_time': self.max_time,
+                'loaded': 'handler' in self._resolved
+            }
+
+
+class RouteRegistry:
+    def __init__(self, package=None):
+        self.package = package
+        self._routes = {}
+
+    def register(self, path, handler, **kwargs):
+        kwargs.setdefault('package', self.package)
+        self._routes[path] = Route(path, handler, **kwargs)
+        return self._routes[path]
+
+    def get(self, path):
+        return self._routes.get(path)
+
+    def stats(self):
+        return {path: route.stats() for path, route in self._routes.items()}
@@ -1,24 +1,39 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, url_for
 from flask_cors import CORS
 from urllib import parse
 
+from ocean_cli.api.cache import LRUCache, get_checksum
+from ocean_cli.api.storage import config_value
 from ocean_cli.ocean import get_ocean
-from ocean_cli.proxy.services import (
-    location_heatmap,
-    gdrive,
-    dropbox_share
-)
+from ocean_cli.proxy.jobs import DONE, FAILED, TIMEOUT, JobQueueFull, \
+    get_job_queue
+from ocean_cli.proxy.routes import RouteBusy
+from ocean_cli.proxy.services import routes
 
 ocean = get_ocean('config.ini')
 
 app = Flask(__name__)
 CORS(app)
 
+# positive authorization decisions and decrypted secrets
+authorizations = LRUCache(maxsize=int(config_value('proxy.auth_cache.size', 1024)),
+                          ttl=int(config_value('proxy.auth_cache.ttl', 60)))
+secrets = LRUCache(maxsize=int(config_value('proxy.secret_cache.size', 256)),
+                   ttl=int(config_value('proxy.secret_cache.ttl', 600)))
+
+
+AUTHORIZATION_ARGS = ('did', 'consumerAddress', 'agreementId',
+                      'agreementIdSignature')
+
 
 def authorize(did=None,
               consumerAddress=None,
               agreementId=None,
               agreementIdSignature=None, **kwargs):
+    key = (did, consumerAddress, agreementId, agreementIdSignature)
+    grant = authorizations.get(key)
+    if grant:
+        return grant
 
     if not (did and consumerAddress) \
             or not ocean.check_permissions(did, consumerAddress)\
@@ -27,46 +42,123 @@ def authorize(did=None,
                     == consumerAddress.lower()):
         raise ValueError('error check_permissions')
 
-    secret = ocean.decrypt(did)[0]
+    secret = get_secret(did)
     if not isinstance(secret, dict):
         raise ValueError('could not decrypt')
 
     print(f'Access granted for {did} to {consumerAddress} with {agreementId}')
-    return \
+    grant = \
         secret['url']['path'], \
         {k: v[0] for k, v in parse.parse_qs(secret['url']['qs']).items()}
-
-
-def handle(path, qs):
-    if path == 'docker/hello':
-        import docker
-        client = docker.from_env()
-        response = client.containers.run("hello-world").decode()
-        return jsonify(response)
-
-    if path == 'locations/map':
-        return location_heatmap.generate_map(**qs)
-
-    if path == 'locations/animation':
-        return location_heatmap.generate_animation(**qs)
-
-    if path == 'gdrive/list':
-        return jsonify(gdrive.list_files(**qs))
-
-    if path == 'gdrive/auth':
-        return jsonify(gdrive.authorize(**qs))
-
-    if path == 'dropbox/auth':
-        return jsonify(dropbox_share.authorize_folder(**qs))
-
-    return 'Not found', 404
+    authorizations.set(key, grant)
+    return grant
+
+
+def get_secret(did):
+    key = (did, get_checksum(did))
+    secret = secrets.get(key)
+    if secret is None:
+        secret = ocean.decrypt(did)[0]
+        if isinstance(secret, dict):
+            secrets.set(key, secret)
+    return secret
+
+
+def invalidate(did=None):
+    if did is None:
+        authorizations.invalidate()
+        secrets.invalidate()
+    else:
+        authorizations.invalidate_matching(lambda key: key[0] == did)
+        secrets.invalidate_matching(lambda key: key[0] == did)
+
+
+def submit(route, kwargs):
+    """
+    Run a slow handler in the job queue, 202 with the url to poll
+    """
+    timeout = config_value(f'proxy.jobs.timeout.{route.path}',
+                           route.timeout)
+    try:
+        job = get_job_queue().submit(
+            route.run, timeout=timeout and int(timeout),
+            respond=route.respond, **kwargs)
+    except JobQueueFull as e:
+        route.release()
+        return jsonify({'error': str(e)}), 503
+    except Exception:
+        route.release()
+        raise
+    url = url_for('job_status', job_id=job.id)
+    return jsonify({**job.to_dict(), 'url': url}), 202, {'Location': url}
+
+
+def handle(path, qs, params=None):
+    """
+    Serve path with the query string from the asset secret; params are
+    the other request arguments, used where the client chooses a value
+    """
+    route = routes.get(path)
+    if route is None:
+        return 'Not found', 404
+    kwargs = {**(params or {}), **qs} if route.params else qs
+    try:
+        route.acquire()
+    except RouteBusy as e:
+        return jsonify({'error': str(e)}), 429, {'Retry-After': '1'}
+    if route.background:
+        return submit(route, kwargs)
+    result = route.run(**kwargs)
+    return route.respond(result)
+
+
+@app.route('/-/auth-cache', methods=['GET', 'DELETE'])
+def auth_cache():
+    if request.remote_addr not in ('127.0.0.1', '::1'):
+        return 'Forbidden', 403
+    if request.method == 'DELETE':
+        invalidate(request.args.get('did'))
+    return jsonify({
+        'authorizations': authorizations.stats(),
+        'secrets': secrets.stats()
+    })
+
+
+@app.route('/-/jobs/<job_id>')
+def job_status(job_id):
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return 'Not found', 404
+    if job.status == DONE:
+        return job.respond(job.result)
+    if job.status == FAILED:
+        return jsonify(job.to_dict()), 500
+    if job.status == TIMEOUT:
+        return jsonify(job.to_dict()), 504
+    return jsonify(job.to_dict()), 202
+
+
+@app.route('/-/jobs')
+def jobs():
+    if request.remote_addr not in ('127.0.0.1', '::1'):
+        return 'Forbidden', 403
+    return jsonify(get_job_queue().stats())
+
+
+@app.route('/-/routes')
+def route_stats():
+    if request.remote_addr not in ('127.0.0.1', '::1'):
+        return 'Forbidden', 403
+    return jsonify(routes.stats())
 
 
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
 def proxy(path):
     try:
-        return handle(*authorize(**request.args))
+        params = {k: v for k, v in request.args.items()
+                  if k not in AUTHORIZATION_ARGS}
+        return handle(*authorize(**request.args), params)
     except (KeyError, ValueError) as e:
         print(e)
         return f'No Access!\nREQUEST:{str(request.args)}', 402
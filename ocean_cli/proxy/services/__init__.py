@@ -0,0 +1,21 @@
+from ocean_cli.proxy.routes import RouteRegistry
+
+# service modules are only imported on the first request to their route
+routes = RouteRegistry(__name__)
+
+routes.register('docker/hello', '.docker_hello:hello_world',
+                respond='flask:jsonify', max_concurrency=2, background=True)
+routes.register('locations/map', '.location_heatmap:render_map',
+                respond='.location_heatmap:respond', max_concurrency=2,
+                background=True)
+routes.register('locations/animation', '.location_heatmap:render_animation',
+                respond='.location_heatmap:respond', max_concurrency=2,
+                background=True)
+routes.register('locations/tiles', '.location_heatmap:tiles',
+                respond='flask:jsonify', max_concurrency=8, params=True)
+routes.register('gdrive/list', '.gdrive:list_files',
+                respond='flask:jsonify', max_concurrency=4)
+routes.register('gdrive/auth', '.gdrive:authorize',
+                respond='flask:jsonify', max_concurrency=4)
+routes.register('dropbox/auth', '.dropbox_share:authorize_folder',
+                respond='flask:jsonify', max_concurrency=2, background=True)
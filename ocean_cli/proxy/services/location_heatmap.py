@@ -1,6 +1,9 @@
-import datetime
+import hashlib
 import json
 import os.path
+import re
+import threading
+import time
 
 import pandas as pd
 import numpy as np
@@ -11,7 +14,9 @@ from branca.element import MacroElement
 from jinja2 import Template
 
 
-from flask import Flask, Response
+from flask import Flask
+
+from ocean_cli.proxy.render_cache import get_render_cache
 
 
 app = Flask(__name__)
@@ -49,101 +54,319 @@ class FloatMacro(MacroElement):
         self.width = width
 
 
-def root_dir():  # pragma: no cover
-    return os.path.abspath(os.path.dirname(__file__))
+DEFAULT_PATH = 'data/Location History.short.json'
 
+# path -> (source mtime, prepared DataFrame, content hash)
+_datasets = {}
+_datasets_lock = threading.Lock()
 
-def get_file(filename):  # pragma: no cover
-    try:
-        src = os.path.join(root_dir(), filename)
-        # Figure out how flask returns static files
-        # Tried:
-        # - render_template
-        # - send_file
-        # This should not be so non-obvious
-        return open(src).read()
-    except IOError as exc:
-        return str(exc)
-
-
-def load(path='data/Location History.short.json'):
-    with open(path, 'r') as fh:
-        raw = json.loads(fh.read())
 
-    # use location_data as an abbreviation for location data
-    location_data = pd.DataFrame(raw['locations'])
-    del raw  # free up some memory
+def columnar_path(path):
+    return f'{path}.npz'
+
+
+def iter_locations(path, buffer_size=1024 * 1024):
+    """
+    Yield the items of the top-level "locations" array one at a time
+    """
+    decoder = json.JSONDecoder()
+    with open(path, 'r') as fh:
+        buffer = ''
+        start = -1
+        while start < 0:
+            chunk = fh.read(buffer_size)
+            if not chunk:
+                return
+            buffer += chunk
+            match = re.search(r'"locations"\s*:\s*\[', buffer)
+            if match:
+                start = match.end()
+            else:
+                # keep enough to match a key split across reads
+                buffer = buffer[-32:]
+
+        buffer, position = buffer[start:], 0
+        eof = False
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if position < len(buffer) and buffer[position] == ']':
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                chunk = fh.read(buffer_size)
+                eof = not chunk
+                buffer, position = buffer[position:] + chunk, 0
+                continue
+            yield item
+
+
+def load_columns(path, chunk_size=65536):
+    """
+    Parse the export into int32 E7 coordinates and int64 timestamps
+
+    Locations with accuracy estimates over 1000m are dropped while parsing
+    and kept points go into preallocated chunks, so memory grows with the
+    filtered output instead of the file size.
+    """
+    chunks = []
+
+    def new_chunk():
+        return (np.empty(chunk_size, np.int32),
+                np.empty(chunk_size, np.int32),
+                np.empty(chunk_size, np.int64))
+
+    latitudes, longitudes, timestamps = new_chunk()
+    size = 0
+    for location in iter_locations(path):
+        # Ignore locations with accuracy estimates over 1000m
+        if location.get('accuracy', 1000) >= 1000:
+            continue
+        latitudes[size] = location['latitudeE7']
+        longitudes[size] = location['longitudeE7']
+        timestamps[size] = int(location['timestampMs'])
+        size += 1
+        if size == chunk_size:
+            chunks.append((latitudes, longitudes, timestamps))
+            latitudes, longitudes, timestamps = new_chunk()
+            size = 0
+    chunks.append((latitudes[:size], longitudes[:size], timestamps[:size]))
     print('data loaded')
-    return location_data
+    return {
+        name: np.concatenate([chunk[i] for chunk in chunks])
+        for i, name in enumerate(('latitudeE7', 'longitudeE7', 'timestampMs'))
+    }
+
+
+def save_columnar(path, columns, mtime):
+    tmp_path = f'{columnar_path(path)}.tmp'
+    with open(tmp_path, 'wb') as fh:
+        np.savez(fh, source_mtime=np.float64(mtime), **columns)
+    os.replace(tmp_path, columnar_path(path))
+
+
+def load_columnar(path, mtime):
+    try:
+        with np.load(columnar_path(path)) as data:
+            if float(data['source_mtime']) != mtime:
+                return None
+            return {name: data[name] for name in
+                    ('latitudeE7', 'longitudeE7', 'timestampMs')}
+    except (IOError, KeyError, ValueError):
+        return None
+
+
+def load_dataset(path=DEFAULT_PATH):
+    """
+    Cleaned and prepared location data, cached per process
+
+    The cache is dropped when the source file's mtime changes. The cleaned
+    columns are also saved next to the source as .npz, so a restart skips
+    parsing the JSON export, which is streamed rather than read whole.
+    """
+    return _get_dataset(path)[0]
+
+
+def dataset_hash(path=DEFAULT_PATH):
+    """
+    sha256 of the cleaned columns, identifying the dataset content
+    """
+    return _get_dataset(path)[1]
+
+
+def _get_dataset(path):
+    mtime = os.path.getmtime(path)
+    with _datasets_lock:
+        cached = _datasets.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1:]
+
+        columns = load_columnar(path, mtime)
+        if columns is None:
+            columns = load_columns(path)
+            save_columnar(path, columns, mtime)
+        digest = hashlib.sha256()
+        for name in sorted(columns):
+            digest.update(columns[name].tobytes())
+        location_data = prepare(pd.DataFrame(columns))
+        _datasets[path] = (mtime, location_data, digest.hexdigest())
+        return _datasets[path][1:]
+
+
+def to_local_datetime(timestamp_ms):
+    """
+    Vectorized datetime.fromtimestamp for millisecond timestamps
+
+    UTC offsets are looked up once per 15 minutes of data, the granularity
+    of timezone transitions.
+    """
+    buckets, inverse = np.unique(timestamp_ms // 900000, return_inverse=True)
+    offsets = np.array([time.localtime(bucket * 900).tm_gmtoff
+                        for bucket in buckets.tolist()], dtype=np.int64)
+    return pd.to_datetime(timestamp_ms + offsets[inverse] * 1000, unit='ms')
 
 
 def prepare(df):
+    timestamp_ms = np.asarray(df['timestampMs']).astype(np.int64)
     df['latitudeE7'] = df['latitudeE7'] / float(1e7)
     df['longitudeE7'] = df['longitudeE7'] / float(1e7)
-    df['timestampMs'] = df['timestampMs'] \
-        .map(lambda x: float(x) / 1000)  # to seconds
-    df['datetime'] = df.timestampMs \
-        .map(datetime.datetime.fromtimestamp)
+    df['timestampMs'] = timestamp_ms / 1000  # to seconds
+    df['datetime'] = to_local_datetime(timestamp_ms)
 
     df.rename(columns={
         'latitudeE7': 'latitude',
         'longitudeE7': 'longitude',
         'timestampMs': 'timestamp'
     }, inplace=True)
-    # Ignore locations with accuracy estimates over 1000m
     df.reset_index(drop=True, inplace=True)
     print('data prepared')
     return df
 
 
-def generate_map(latitude=39.7,
-                 longitude=3,
-                 zoom=8,
-                 did=None,
-                 emailAddress=None, *args, **kwargs):
-    location_data = load()
-
-    location_data = location_data[location_data.accuracy < 1000]
-    location_data = prepare(location_data)
-
-    m = folium.Map([float(latitude), float(longitude)], zoom_start=int(zoom))
-    geo_matrix = location_data[['latitude', 'longitude']].values
-
-    m.add_child(plugins.HeatMap(geo_matrix, radius=15))
-    m.add_child(folium.LatLngPopup())
+# cells per tile side: a 256px map tile holds 16x16 cells of 16px
+CELLS_PER_TILE = 16
+MAX_ZOOM = 18
+
+# dataset hash -> {zoom: (latitudes, longitudes, weights)}
+_grids = {}
+_grids_lock = threading.Lock()
+
+
+def build_grids(location_data, max_zoom=MAX_ZOOM):
+    """
+    Bin points into Web Mercator grid cells for every zoom level
+
+    The finest level is binned once; each coarser level merges 2x2 cells
+    of the level above. Cells are returned as their centre and the number
+    of points they hold.
+    """
+    latitude = np.radians(location_data['latitude'].values)
+    x = (location_data['longitude'].values + 180) / 360
+    y = (1 - np.log(np.tan(latitude) + 1 / np.cos(latitude)) / np.pi) / 2
+    size = CELLS_PER_TILE << max_zoom
+    ix = np.clip((x * size).astype(np.int64), 0, size - 1)
+    iy = np.clip((y * size).astype(np.int64), 0, size - 1)
+    weights = np.ones(len(ix), dtype=np.int64)
+
+    grids = {}
+    for zoom in range(max_zoom, -1, -1):
+        cells, inverse = np.unique((ix << 32) | iy, return_inverse=True)
+        weights = np.bincount(inverse, weights=weights).astype(np.int64)
+        ix, iy = cells >> 32, cells & 0xffffffff
+        size = CELLS_PER_TILE << zoom
+        lon = (ix + 0.5) / size * 360 - 180
+        lat = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (iy + 0.5) / size))))
+        grids[zoom] = (lat, lon, weights)
+        ix, iy = ix >> 1, iy >> 1
+    return grids
+
+
+def aggregate(zoom, path=DEFAULT_PATH):
+    """
+    (latitudes, longitudes, weights) of the grid cells at zoom
+    """
+    zoom = min(max(int(zoom), 0), MAX_ZOOM)
+    digest = dataset_hash(path)
+    with _grids_lock:
+        if digest not in _grids:
+            _grids.clear()
+            _grids[digest] = build_grids(load_dataset(path))
+        return _grids[digest][zoom]
+
+
+def tiles(south=-90, west=-180, north=90, east=180, zoom=8,
+          *args, **kwargs):
+    """
+    Aggregated cells inside a bounding box, as [[lat, lon, weight], ...]
+    """
+    lat, lon, weights = aggregate(zoom)
+    south, west, north, east = map(float, (south, west, north, east))
+    inside = (lat >= south) & (lat <= north)
+    if west <= east:
+        inside &= (lon >= west) & (lon <= east)
+    else:
+        # bounding box across the antimeridian
+        inside &= (lon >= west) | (lon <= east)
+    return {
+        'zoom': min(max(int(zoom), 0), MAX_ZOOM),
+        'cells': np.column_stack(
+            (lat[inside], lon[inside], weights[inside])).tolist(),
+        'points': int(weights[inside].sum())
+    }
+
+
+def render_map(latitude=39.7,
+               longitude=3,
+               zoom=8,
+               did=None,
+               emailAddress=None, *args, **kwargs):
+    """
+    Render the heatmap into the render cache and return its key; shares
+    it on Google Drive when emailAddress is set
+    """
+    latitude, longitude, zoom = float(latitude), float(longitude), int(zoom)
+    cache = get_render_cache()
+    key = cache.key('map', dataset_hash(), latitude, longitude, zoom)
+
+    def render(fn):
+        lat, lon, weights = aggregate(zoom)
+        m = folium.Map([latitude, longitude], zoom_start=zoom)
+        geo_matrix = np.column_stack((lat, lon, weights)).tolist()
+
+        m.add_child(plugins.HeatMap(geo_matrix, radius=15))
+        m.add_child(folium.LatLngPopup())
+        m.save(fn)
+
+    fn = cache.get_or_render(key, render)
     mime_html = 'text/html'
-
-    fn = os.getcwd() + (f'/proxy-{did}.html' or '/did/index.html')
-    m.save(fn)
     if emailAddress:
         from .gdrive import upload, authorize
-        fileId = upload(fn, mime_html)
+        fileId = upload(fn, mime_html, {'name': f'proxy-{did}.html'})
         print(fileId, emailAddress)
         authorize(emailAddress=emailAddress, fileId=fileId)
+    return key
+
+
+def respond(key):
+    return get_render_cache().response(key, mimetype='text/html')
+
+
+def generate_map(*args, **kwargs):
+    return respond(render_map(*args, **kwargs))
+
+
+def animation_frames(location_data, epochs):
+    """
+    Split the points in `epochs` frames of [[latitude, longitude], ...]
+    """
+    geo_matrix = location_data[['latitude', 'longitude']].values
+    return [frame.tolist()
+            for frame in np.array_split(geo_matrix, int(epochs))]
 
-    content = get_file(fn)
-    return Response(content, mimetype=mime_html)
 
+def render_animation(epochs=10, *args, **kwargs):
+    epochs = int(epochs)
+    cache = get_render_cache()
+    key = cache.key('animation', dataset_hash(), epochs)
 
-def generate_animation(epochs=10, *args, **kwargs):
-    location_data = load()
+    def render(fn):
+        location_data = load_dataset()
+        m = folium.Map([location_data.latitude.median(),
+                        location_data.longitude.median()],
+                       zoom_start=9)
+        heat_data = animation_frames(location_data, epochs)
 
-    location_data = location_data[location_data.accuracy < 1000]
-    location_data = prepare(location_data)
+        plugins.HeatMapWithTime(heat_data, auto_play=True,
+                                max_opacity=0.8).add_to(m)
+        m.add_child(folium.LatLngPopup())
+        m.save(fn)
 
-    m = folium.Map([location_data.latitude.median(),
-                    location_data.longitude.median()],
-                   zoom_start=9)
-    heat_df = np.array_split(location_data, int(epochs))
-    # List comprehension to make out list of lists
-    heat_data = [
-        [[row['latitude'], row['longitude']] for index, row in _df.iterrows()]
-        for _df in heat_df]
+    cache.get_or_render(key, render)
+    return key
 
-    plugins.HeatMapWithTime(heat_data, auto_play=True, max_opacity=0.8).add_to(m)
-    m.add_child(folium.LatLngPopup())
-    fn = os.getcwd() + '/index.html'
-    m.save(fn)
-    content = get_file(fn)
-    return Response(content, mimetype="text/html")
 
+def generate_animation(*args, **kwargs):
+    return respond(render_animation(*args, **kwargs))
@@ -0,0 +1,166 @@
+import io
+import json
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+
+
+class ThreadLocalStream:
+    """
+    Replaces sys.stdout/sys.stderr so each thread can capture its output
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._local = threading.local()
+
+    def capture(self, buffer=None):
+        self._local.buffer = io.StringIO() if buffer is None else buffer
+        return self._local.buffer
+
+    def release(self):
+        self._local.buffer = None
+
+    @property
+    def captured(self):
+        return getattr(self._local, 'buffer', None)
+
+    @property
+    def _target(self):
+        buffer = self.captured
+        return self._stream if buffer is None else buffer
+
+    def write(self, text):
+        return self._target.write(text)
+
+    def flush(self):
+        return self._target.flush()
+
+    def isatty(self):
+        return self._target.isatty()
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+_install_lock = threading.Lock()
+_thread_start = threading.Thread.start
+
+
+def _start_captured(thread):
+    """
+    Thread.start that hands the starting thread's capture to the new one
+
+    Pools created by a command (pull, push, 'all' sweeps) then print to
+    the command's output instead of the daemon's terminal.
+    """
+    streams = (sys.stdout, sys.stderr)
+    buffers = tuple(stream.captured
+                    if isinstance(stream, ThreadLocalStream) else None
+                    for stream in streams)
+    if None not in buffers:
+        run = thread.run
+
+        def run_captured():
+            for stream, buffer in zip(streams, buffers):
+                stream.capture(buffer)
+            try:
+                run()
+            finally:
+                for stream in streams:
+                    stream.release()
+
+        thread.run = run_captured
+    _thread_start(thread)
+
+
+def install_capture():
+    with _install_lock:
+        if not isinstance(sys.stdout, ThreadLocalStream):
+            sys.stdout = ThreadLocalStream(sys.stdout)
+        if not isinstance(sys.stderr, ThreadLocalStream):
+            sys.stderr = ThreadLocalStream(sys.stderr)
+        threading.Thread.start = _start_captured
+
+
+def run_command(args, obj):
+    """
+    Run an ocean CLI command in this process, returning its exit code and
+    output. obj is passed to the ocean group, e.g. a shared Ocean instance.
+    Safe to call from several threads at once.
+    """
+    from ocean_cli.ocean import ocean
+
+    install_capture()
+    stdout, stderr = sys.stdout.capture(), sys.stderr.capture()
+    try:
+        try:
+            rv = ocean.main(args=list(args), prog_name='ocean',
+                            obj=dict(obj), standalone_mode=False)
+            exit_code = rv if isinstance(rv, int) else 0
+        except click.ClickException as e:
+            e.show()
+            exit_code = e.exit_code
+        except click.Abort:
+            click.echo('Aborted!', err=True)
+            exit_code = 1
+        except SystemExit as e:
+            exit_code = e.code if isinstance(e.code, int) else 1
+        except Exception:
+            traceback.print_exc()
+            exit_code = 1
+    finally:
+        sys.stdout.release()
+        sys.stderr.release()
+    return exit_code, stdout.getvalue(), stderr.getvalue()
+
+
+def parse_batch_line(line):
+    """
+    {"command": "assets get-owner", "args": ["did:op:..."]} -> argv
+    """
+    entry = json.loads(line)
+    args = entry.get('command', '').split() + \
+        [str(arg) for arg in entry.get('args', [])]
+    if not args:
+        raise ValueError('no command')
+    if args[0] in ('batch', 'daemon'):
+        raise ValueError(f'{args[0]} cannot run inside a batch')
+    return args
+
+
+def run_batch_line(number, line, obj):
+    started = time.time()
+    result = {'line': number}
+    try:
+        args = parse_batch_line(line)
+    except ValueError as e:
+        result.update(status='error', exit_code=2, error=str(e))
+    else:
+        exit_code, stdout, stderr = run_command(['--as-json'] + args, obj)
+        try:
+            output = json.loads(stdout)
+        except ValueError:
+            output = stdout
+        result.update(status='ok' if exit_code == 0 else 'error',
+                      exit_code=exit_code,
+                      output=output,
+                      stderr=stderr)
+    result['elapsed'] = round(time.time() - started, 3)
+    return result
+
+
+def run_batch(lines, obj, workers=1):
+    """
+    Run a JSONL list of commands sharing one Ocean instance, yielding one
+    result per line in input order
+    """
+    commands = [(number, line) for number, line in enumerate(lines, 1)
+                if line.strip()]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(lambda command: run_batch_line(*command, obj),
+                                commands)
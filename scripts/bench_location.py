@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+"""
+Compare the row-by-row and vectorized location preparation and animation
+frame building on synthetic Location History data
+
+usage: python scripts/bench_location.py [--sizes 1000000 10000000] [--epochs 10]
+"""
+import argparse
+import datetime
+import time
+
+import numpy as np
+import pandas as pd
+
+from ocean_cli.proxy.services.location_heatmap import animation_frames, prepare
+
+
+def prepare_rows(df):
+    df['latitudeE7'] = df['latitudeE7'] / float(1e7)
+    df['longitudeE7'] = df['longitudeE7'] / float(1e7)
+    df['timestampMs'] = df['timestampMs'] \
+        .map(lambda x: float(x) / 1000)  # to seconds
+    df['datetime'] = df.timestampMs \
+        .map(datetime.datetime.fromtimestamp)
+
+    df.rename(columns={
+        'latitudeE7': 'latitude',
+        'longitudeE7': 'longitude',
+        'timestampMs': 'timestamp'
+    }, inplace=True)
+    df.reset_index(drop=True, inplace=True)
+    return df
+
+
+def animation_frames_rows(location_data, epochs):
+    heat_df = [location_data.iloc[rows] for rows in
+               np.array_split(np.arange(len(location_data)), int(epochs))]
+    return [
+        [[row['latitude'], row['longitude']] for index, row in _df.iterrows()]
+        for _df in heat_df]
+
+
+def synthetic(size, seed=0):
+    random = np.random.RandomState(seed)
+    start = 1400000000000
+    return pd.DataFrame({
+        'latitudeE7': random.randint(390000000, 400000000, size),
+        'longitudeE7': random.randint(20000000, 40000000, size),
+        'timestampMs': (start + np.cumsum(random.randint(1, 120000, size)))
+        .astype(str),
+    })
+
+
+def timed(fn, *args):
+    started = time.time()
+    result = fn(*args)
+    return result, time.time() - started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[1000000, 10000000])
+    parser.add_argument('--epochs', type=int, default=10)
+    options = parser.parse_args()
+
+    for size in options.sizes:
+        data = synthetic(size)
+        old, old_prepare = timed(prepare_rows, data.copy())
+        new, new_prepare = timed(prepare, data.copy())
+        pd.testing.assert_frame_equal(old, new, check_dtype=False)
+        old_frames, old_animation = timed(animation_frames_rows, old,
+                                          options.epochs)
+        new_frames, new_animation = timed(animation_frames, new,
+                                          options.epochs)
+        assert old_frames == new_frames
+        print(f'{size:>10} points'
+              f'  prepare {old_prepare:8.2f}s -> {new_prepare:6.2f}s'
+              f'  frames {old_animation:8.2f}s -> {new_animation:6.2f}s')
+
+
+if __name__ == '__main__':
+    main()
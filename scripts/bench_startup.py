@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+"""
+Time CLI startup for commands that should not need a network connection
+
+usage: python scripts/bench_startup.py [-n RUNS] [-c CONFIG_FILE]
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+COMMANDS = [
+    ['--help'],
+    ['accounts', 'get'],
+]
+
+
+def run(args, config_file):
+    started = time.time()
+    subprocess.run([sys.executable, '-m', 'ocean_cli.ocean',
+                    '-c', config_file] + args,
+                   stdout=subprocess.DEVNULL, check=True)
+    return time.time() - started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--runs', type=int, default=10)
+    parser.add_argument('-c', '--config-file', default='config.ini')
+    options = parser.parse_args()
+
+    for args in COMMANDS:
+        timings = [run(args, options.config_file)
+                   for _ in range(options.runs)]
+        print(f"ocean {' '.join(args):<15}"
+              f" median {1000 * statistics.median(timings):7.1f} ms"
+              f"  min {1000 * min(timings):7.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+from types import SimpleNamespace
+
+from squid_py.keeper.agreements.agreement_manager import AgreementValues
+
+from ocean_cli.api.events import (
+    handle_agreement_created,
+    load_agreement,
+    wait_for_agreement
+)
+
+AGREEMENT_ID = '0x' + '11' * 32
+DID_ID = '0x' + 'ab' * 32
+PROVIDER = '0x' + '22' * 20
+CONSUMER = '0x' + '33' * 20
+
+
+def make_ocean(did=DID_ID, provider=PROVIDER):
+    # squid's AgreementStoreManager.get_agreement returns the DID as a str
+    agreement = AgreementValues(did, PROVIDER, '0x' + '44' * 32, [], PROVIDER,
+                                1)
+    template = SimpleNamespace(
+        get_agreement_data=lambda agreement_id: (CONSUMER, provider))
+    return SimpleNamespace(
+        account=SimpleNamespace(address=PROVIDER),
+        agreements=SimpleNamespace(get=lambda agreement_id: agreement),
+        keeper=SimpleNamespace(escrow_access_secretstore_template=template)
+    )
+
+
+def test_wait_for_agreement_str_did():
+    ocean = make_ocean()
+    assert wait_for_agreement(ocean, AGREEMENT_ID).did == DID_ID
+
+
+def test_handle_agreement_created_str_did():
+    event = {'args': {'_accessConsumer': CONSUMER,
+                      '_accessProvider': PROVIDER}}
+    agreement = handle_agreement_created(event=event,
+                                         agreement_id=AGREEMENT_ID,
+                                         ocean=make_ocean())
+    assert agreement == {
+        'did': 'did:op:' + 'ab' * 32,
+        'consumer': CONSUMER,
+        'provider': PROVIDER
+    }
+
+
+def test_load_agreement_str_did():
+    record = load_agreement(make_ocean(), AGREEMENT_ID)
+    assert record.did == 'did:op:' + 'ab' * 32
+    assert (record.consumer, record.provider) == (CONSUMER, PROVIDER)
+
+
+def test_load_agreement_not_ours():
+    ocean = make_ocean(provider='0x' + '55' * 20)
+    assert load_agreement(ocean, AGREEMENT_ID) is None
+
+
+def test_load_agreement_unknown():
+    ocean = make_ocean(did='0x' + '00' * 32)
+    assert load_agreement(ocean, AGREEMENT_ID) is None